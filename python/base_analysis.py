@@ -22,6 +22,10 @@
     Martin E. Liza   07/21/2021   Implement vorticity_calculations. 
     Martin E. Liza   08/29/2021   Added add_new_variable. 
     Martin E. Liza   07/16/2022   Added helper_class from SCRIPTS.  
+    Martin E. Liza   10/18/2026   Added add_new_variables, one write for
+                                  several variables. 
+    Martin E. Liza   10/18/2026   Batched filter_decay with the cached 
+                                  1/10th decade filter. 
 '''
 import os 
 import pickle
@@ -30,7 +34,7 @@ import matplotlib.pyplot as plt
 import matplotlib.gridspec as gridspec
 import seaborn as sb 
 from scipy import integrate
-from scipy.fft import fft 
+from scipy.fft import rfft 
 from scipy.special import legendre 
 import IPython
 # Mine 
@@ -40,6 +44,7 @@ scripts_path = os.environ.get('SCRIPTS')
 python_scripts = os.path.join(scripts_path, 'Python') 
 sys.path.insert(1, python_scripts)
 import helper_class  
+import spectrum_filter
 IPython.embed(colors = 'Linux') 
 
 class Base_Analysis:
@@ -77,6 +82,14 @@ class Base_Analysis:
         helper = helper_class.Helper() 
         helper.pickle_manager(pickle_save_name, pickle_path, data_total) 
 
+# Adds several new variables ({name: data}) with a single pickle write 
+    def add_new_variables(self, dataset_number, new_variables_dict, 
+                          pickle_path, pickle_save_name):
+        data_total = self.working_data[dataset_number]
+        data_total.update(new_variables_dict) 
+        helper = helper_class.Helper() 
+        helper.pickle_manager(pickle_save_name, pickle_path, data_total) 
+
 # Calculates Reynolds decomposition
     def reynolds_decomposition(self, variable):
         fluctuation = variable - np.mean(variable)  
@@ -139,31 +152,20 @@ class Base_Analysis:
         return scales_dict 
 
 # Calculates filter decay, energy spectrum 
-    def filter_decay(self, variable, n_bin_number=2): 
-        # Filter setup 1/10 decay
-        data_size            = np.shape(variable)[0] 
-        variable_hat         = fft(variable, data_size) 
-        pwr_spectral_density = ( variable_hat * np.conj(variable_hat) 
-                                 / data_size ).real   
+    def filter_decay(self, variable, n_bin_number=2, axis=0): 
+        # Filter setup 1/10 decay, every line along axis in one fft call 
+        data_size            = np.shape(variable)[axis] 
+        variable_hat         = rfft(variable, data_size, axis=axis) 
+        pwr_spectral_density = np.moveaxis(np.abs(variable_hat)**2 / 
+                                           data_size, axis, -1)
         bin_number           = int( np.floor(data_size / n_bin_number) + 1 ) 
-        bin_vector           = range(1, bin_number + 1)
-        pwf                  = np.zeros(bin_number) 
-        log_freq             = np.log10(bin_vector) 
 
         # Butterworth filter spectrum with 1/10th decade filter 
-        for i in range(bin_number - 1):
-            count   = 0
-            sum_pwr_spectral_density = 0
-            log_freq_0 = log_freq[i] - 0.05 #initial 
-            log_freq_t = log_freq[i] + 0.05 #final 
-            for j in range(bin_number - 1):
-                if (log_freq[j] > log_freq_0 and log_freq[j] < log_freq_t):
-                    count += 1
-                    sum_pwr_spectral_density += pwr_spectral_density[j] 
-            if (count != 0):
-                pwf[i] = sum_pwr_spectral_density / count 
+        pwf = spectrum_filter.decade_filter(pwr_spectral_density, bin_number,
+                                            data_size)
         # Append a 0 at the beginning of the pwr spectral 
-        pwr_spectral = np.append(0, pwf[0:bin_number-2]) 
+        pwr_spectral = np.concatenate([np.zeros(np.shape(pwf)[:-1] + (1,)), 
+                                       pwf[...,:-1]], axis=-1) 
         return pwr_spectral  
 
 # Sub sampling 
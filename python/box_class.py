@@ -16,6 +16,29 @@
     Martin E. Liza   09/03/2022   Added energy spectrum, correlation
                                   and str_location functions. 
     Martin E. Liza   10/22/2022   Added coarser_field function.
+    Martin E. Liza   10/18/2026   Vectorized split_plot3D, added 
+                                  fortran_ordering fast path.
+    Martin E. Liza   10/18/2026   Added Box_Mapping, analytic mapping.
+    Martin E. Liza   10/18/2026   Added dtype precision policy, 
+                                  compensated_add and precision_check.
+    Martin E. Liza   10/18/2026   Added block_mean and coarser_pyramid.
+    Martin E. Liza   10/18/2026   Vectorized mean_fields over x chunks.
+    Martin E. Liza   10/18/2026   Broadcast reynolds_decomposition with 
+                                  axis, out and mean_in options.
+    Martin E. Liza   10/18/2026   Added fused fluctuation_fields and 
+                                  turbulence_statistics.
+    Martin E. Liza   10/18/2026   Vectorized edge properties, added 
+                                  edge_crossing (interpolated, batched).
+    Martin E. Liza   10/18/2026   Block coarser_field with per axis widths
+                                  and remainder policy, cell_volumes.
+    Martin E. Liza   10/18/2026   FFT batched correlation_function.
+    Martin E. Liza   10/18/2026   Batched energy_spectrum, cached 1/10th 
+                                  decade filter (spectrum_filter).
+    Martin E. Liza   10/18/2026   Added spectrum_map, E(kz; x, y).
+    Martin E. Liza   10/18/2026   Chunked gradient_fields with selectable
+                                  outputs (gradient_terms, Gradient_Chunk).
+    Martin E. Liza   10/18/2026   Added gradient_invariants (P, Q, R, 
+                                  lambda2, swirling strength).
 '''
 import numpy as np 
 import pandas as pd 
@@ -23,37 +46,148 @@ import matplotlib.pyplot as plt
 import IPython
 import sys 
 import os 
-from dataclasses import dataclass, field  
+from dataclasses import dataclass, field, replace  
+from concurrent.futures import ThreadPoolExecutor
 from scipy import integrate 
-from scipy.fft import fft 
-from scipy.io import FortranFile
+from scipy.fft import rfft, irfft, next_fast_len 
 from scipy.optimize import curve_fit 
 # My own stuff 
 scripts_path   = os.environ.get('SCRIPTS')
 python_scripts = os.path.join(scripts_path, 'Python') 
 sys.path.append(python_scripts) 
 import helper_class as helper 
+import spectrum_filter
+
+# Mapping Class, i-fastest ordering written by mapping_m.f90 
+@dataclass 
+class Box_Mapping():
+# Initialize variables 
+    nx: int
+    ny: int
+    nz: int
+    n_total : int = field(init=False)
+    strides : tuple = field(init=False)
+
+ # Initialize variables 
+    def __post_init__(self):
+        self.n_total = self.nx * self.ny * self.nz 
+        self.strides = (1, self.nx, self.nx * self.ny) 
+
+# Same length and shape as the legacy [n_total, 4] table 
+    def __len__(self):
+        return self.n_total 
+
+    @property 
+    def shape(self):
+        return (self.n_total, 4) 
+
+# Rows computed on demand, mapping[n] = [i, j, k, n]
+    def __getitem__(self, key):
+        if isinstance(key, tuple):
+            return self.to_array(key[0])[(slice(None),) + key[1:]]
+        return self.to_array(key)
+
+# Returns the i, j, k indices of the n index 
+    def indices(self, n):
+        i = n % self.strides[1] 
+        j = (n % self.strides[2]) // self.strides[1]
+        k = n // self.strides[2] 
+        return i, j, k 
+
+# Returns the [n, 4] table for the given rows (all of them by default) 
+    def to_array(self, key=slice(None)):
+        n = np.arange(self.n_total)[key] 
+        [i, j, k] = self.indices(n) 
+        return np.stack([i, j, k, n], axis=-1)
+
+# Compares against the legacy fortran mapping file (sequential records of 
+# 4 integers with 4 byte markers), raises ValueError if they differ
+    def validate(self, mapping_data_in, chunk_size=2**22):
+        record    = np.dtype([('head', np.int32), ('row', np.int32, 4), 
+                              ('tail', np.int32)])
+        file_size = os.path.getsize(mapping_data_in) 
+        if file_size != self.n_total * record.itemsize:
+            raise ValueError(f'{mapping_data_in} does not match a '
+                             f'{self.nx}x{self.ny}x{self.nz} mapping')
+        mapping_in = np.memmap(mapping_data_in, dtype=record, mode='r') 
+        for n in range(0, self.n_total, chunk_size):
+            n_end = min(n + chunk_size, self.n_total)
+            if not np.array_equal(mapping_in['row'][n:n_end], 
+                                  self.to_array(slice(n, n_end))):
+                raise ValueError(f'{mapping_data_in} differs from the '
+                                 f'analytic mapping between {n} and {n_end}')
+        return True
+
+# Gradient terms, GRADV_ij = du_j/dx_i = d_i u_j (not jacobian). 
+# Rotation_ij = 1/2 (grad_ji - grad_ij), Strain_ij = 1/2 (grad_ji + grad_ij)
+# and the norms are Frobenius norms squared ||A||^2 = sum |a_ij|^2 
+gradient_terms = { 
+    'UMAG'               : lambda t: np.sqrt(t['Ux']**2 + t['Uy']**2 + 
+                                             t['Uz']**2),
+    'rotation_zy'        : lambda t: 0.5 * (t['GRADV_23'] - t['GRADV_32']),
+    'rotation_xz'        : lambda t: 0.5 * (t['GRADV_31'] - t['GRADV_13']),
+    'rotation_yx'        : lambda t: 0.5 * (t['GRADV_12'] - t['GRADV_21']),
+    'shear_yx'           : lambda t: 0.5 * (t['GRADV_12'] + t['GRADV_21']),
+    'shear_xz'           : lambda t: 0.5 * (t['GRADV_31'] + t['GRADV_13']),
+    'shear_zy'           : lambda t: 0.5 * (t['GRADV_23'] + t['GRADV_32']),
+    'rotation_rate_norm' : lambda t: ((2 * t['rotation_zy'])**2 + 
+                                      (2 * t['rotation_xz'])**2 + 
+                                      (2 * t['rotation_yx'])**2),
+    'pure_shear_norm'    : lambda t: ((2 * t['shear_yx'])**2 + 
+                                      (2 * t['shear_xz'])**2 + 
+                                      (2 * t['shear_zy'])**2),
+    'dilatation_norm'    : lambda t: (t['GRADV_11']**2 + t['GRADV_22']**2 + 
+                                      t['GRADV_33']**2),
+    'shear_rate_norm'    : lambda t: t['dilatation_norm'] + t['pure_shear_norm'],
+    'DIL'                : lambda t: t['GRADV_11'] + t['GRADV_22'] + t['GRADV_33'],
+    'Q'                  : lambda t: 0.5 * (t['rotation_rate_norm'] - 
+                                            t['pure_shear_norm'] - 
+                                            t['dilatation_norm']),
+    'VORTMAG'            : lambda t: np.sqrt(t['rotation_rate_norm']) }
+gradient_outputs = list(gradient_terms.keys())
+
+# Outputs of Box.gradient_invariants 
+invariant_outputs = ['P_inv', 'Q_inv', 'R_inv', 'lambda2', 'swirling_strength']
+
+# Terms of one x slab, inputs are read (float64) and terms are computed the 
+# first time they are needed, then reused by the other terms of the slab 
+class Gradient_Chunk(dict):
+    def __init__(self, array_dict3D, x_slice):
+        self.array_dict3D = array_dict3D
+        self.x_slice      = x_slice
+
+    def __missing__(self, key):
+        if key in gradient_terms:
+            value = gradient_terms[key](self)
+        else:
+            value = np.asarray(self.array_dict3D[key][self.x_slice], 
+                               dtype=np.float64)
+        self[key] = value 
+        return value 
 
 # Probe Class 
+# dtype is the storage and compute precision of the 3D fields ('float32' 
+# halves memory and disk), reductions are always accumulated in float64 
 @dataclass 
 class Box():
 # Initialize variables 
     nx: int
     ny: int
     nz: int
+    dtype   : str = 'float64'
     n_total : int = field(init=False)
 
  # Initialize variables 
     def __post_init__(self):
         self.n_total = self.nx * self.ny * self.nz 
+        self.dtype   = np.dtype(self.dtype) 
     
-# Loads mapping fortran data and saves a pickle file if pickle_path given 
-    def mapping_reader(self, mapping_data_in, pickle_path=None):
-        mapping_out = np.empty([self.n_total, 4], dtype=int)
-        f_in        = FortranFile(mapping_data_in, 'r') 
-        for n in range(self.n_total):
-            mapping_out[n] = f_in.read_ints() 
-        f_in.close() 
+# Returns the analytic mapping, the legacy fortran file is only used to 
+# validate it. Saves a pickle file if pickle_path given 
+    def mapping_reader(self, mapping_data_in=None, pickle_path=None):
+        mapping_out = Box_Mapping(nx=self.nx, ny=self.ny, nz=self.nz) 
+        if mapping_data_in is not None:
+            mapping_out.validate(mapping_data_in) 
         # Save as a pickle file 
         if pickle_path is None:
             return mapping_out
@@ -63,90 +197,268 @@ class Box():
                                           pickle_path=pickle_path, 
                                           data_to_save=mapping_out)
 
-# Split the 1D array into a 3D array 
+# Split the 1D array into a 3D array
     def split_plot3D(self, array_1D, mapping):
-        array_3D = np.empty([self.nx, self.ny, self.nz])
-        for n in range(self.n_total):
-            # Mapping = [n, i, j, k] 
-            i = mapping[n][0]
-            j = mapping[n][1]
-            k = mapping[n][2]
-            array_3D[i,j,k] = array_1D[n]  
+        # Fast path, i-fastest mapping is a fortran reshape (no copy)
+        if self.fortran_ordering(mapping):
+            array_3D = np.reshape(array_1D, [self.nx, self.ny, self.nz], 
+                                  order='F')
+            return array_3D.astype(self.dtype, copy=False)
+        # Mapping = [i, j, k, n]
+        array_3D = np.empty([self.nx, self.ny, self.nz], dtype=self.dtype)
+        array_3D[mapping[:,0], mapping[:,1], mapping[:,2]] = array_1D
         return array_3D
 
-# Coarse mesh
-    def coarser_field(self, field_3D, f_width):
-        # Spacing vectors, with a filter width increment   
-        fx  = range(0, self.nx, f_width)
-        fy  = range(0, self.ny, f_width)
-        fz  = range(0, self.nz, f_width)
-        coarser_field = np.empty([len(fx)-1, len(fy)-1, len(fz)-1])
-        # fi, fj, fk increment on the spacing vector 
-        # i, j, k increments on the unfiltered field.
-        for i, fi in enumerate(fx[:-1]):
-            for j, fj in enumerate(fy[:-1]):
-                for k, fk in enumerate(fz[:-1]):
-                    coarser_field[i,j,k] = np.mean(field_3D[fi:fi+f_width,
-                                                            fj:fj+f_width,
-                                                            fk:fk+f_width])
+# Checks if the mapping is the i-fastest ordering written by f_mapping
+    def fortran_ordering(self, mapping):
+        if isinstance(mapping, Box_Mapping):
+            return (mapping.nx, mapping.ny, mapping.nz) == (self.nx, self.ny, 
+                                                            self.nz)
+        mapping = np.asarray(mapping)
+        if np.shape(mapping) != (self.n_total, 4):
+            return False
+        # Cheap checks on the first plane before the full comparison
+        n_plane = min(self.nx * self.ny, self.n_total)
+        n_index = np.arange(n_plane)
+        if not (np.array_equal(mapping[:n_plane,0], n_index % self.nx) and
+                np.array_equal(mapping[:n_plane,1], n_index // self.nx)):
+            return False
+        # Every plane has the same (i, j) pattern and a constant k
+        mapping_3D = mapping[:,:3].reshape(self.nz, self.nx * self.ny, 3)
+        return bool(np.all(mapping_3D[:,:,:2] == mapping_3D[:1,:,:2]) and
+                    np.all(mapping_3D[:,:,2] == np.arange(self.nz)[:,None]))
+
+# Coarse mesh, block means of widths f_width (int or [fx, fy, fz]). The 
+# trailing cells that do not fill a block are handled by remainder: 'drop' 
+# (ignored), 'pad' (edge values repeated to fill the block) or 'partial' 
+# (mean of the remaining cells). weights (e.g. cell_volumes) gives grid 
+# weighted means. Computed in x chunks of about chunk_size planes 
+    def coarser_field(self, field_3D, f_width, remainder='drop', weights=None,
+                      chunk_size=64):
+        if remainder not in ['drop', 'pad', 'partial']:
+            raise ValueError(f'Unknown remainder {remainder}, use drop, pad '
+                              'or partial')
+        widths     = [int(w) for w in np.broadcast_to(f_width, 3)]
+        field_size = np.shape(field_3D)
+        if remainder == 'drop':
+            n_blocks = [n // w for n, w in zip(field_size, widths)]
+        else:
+            n_blocks = [-(-n // w) for n, w in zip(field_size, widths)]
+        coarser_field = np.empty(n_blocks, dtype=self.dtype)
+        x_step = widths[0] * max(1, chunk_size // widths[0])
+        x_end  = min(n_blocks[0] * widths[0], field_size[0])
+        for i in range(0, x_end, x_step):
+            chunk   = np.asarray(field_3D[i:min(i + x_step, x_end)], 
+                                 dtype=np.float64)
+            weights_chunk = None 
+            if weights is not None:
+                weights_chunk = np.broadcast_to(weights, 
+                                        field_size)[i:min(i + x_step, x_end)]
+            coarser_field[i // widths[0]:(i + x_step) // widths[0]] = \
+                    self.block_reduce(chunk, widths, remainder, weights_chunk)
         return coarser_field 
 
-# Return a dictionary with gradient fields 
-    def gradient_fields(self, array_dict3D):  
-        # GRADV_ij = du_j/dx_i = d_i u_j  (not jacobian) 
-        u_mag      = np.sqrt(array_dict3D['Ux']**2 + 
-                             array_dict3D['Uy']**2 + 
-                             array_dict3D['Uz']**2) 
-
-        # Rotation_ij = 1/2 (grad_ji - grad_ij)
-        rotation_zy = 1/2 * (array_dict3D['GRADV_23'] - array_dict3D['GRADV_32']) 
-        rotation_xz = 1/2 * (array_dict3D['GRADV_31'] - array_dict3D['GRADV_13'])
-        rotation_yx = 1/2 * (array_dict3D['GRADV_12'] - array_dict3D['GRADV_21'])
-
-        # Strain_ij = 1/2 (grad_ji + grad_ij)
-        strain_yx = 1/2 * (array_dict3D['GRADV_12'] + array_dict3D['GRADV_21']) 
-        strain_xz = 1/2 * (array_dict3D['GRADV_31'] + array_dict3D['GRADV_13'])  
-        strain_zy = 1/2 * (array_dict3D['GRADV_23'] + array_dict3D['GRADV_32']) 
-
-        # Fibonacci Norm square ||A|| = sqrt(sum |a_ij|^2) 
-        # Norms are fibonacy norm square  
-        rotation_norm   = ( (2 * rotation_zy)**2 + 
-                            (2 * rotation_xz)**2 + 
-                            (2 * rotation_yx)**2 )
-
-        shear_norm      = ( (2 * strain_yx)**2 + 
-                            (2 * strain_xz)**2 + 
-                            (2 * strain_zy)**2 )
-        dilatation_norm = ( array_dict3D['GRADV_11']**2 + 
-                            array_dict3D['GRADV_22']**2 + 
-                            array_dict3D['GRADV_33']**2 ) 
-        dilatation      = ( array_dict3D['GRADV_11'] + 
-                            array_dict3D['GRADV_22'] + 
-                            array_dict3D['GRADV_33'] ) 
-        Q               = 0.5 * (rotation_norm - shear_norm - dilatation_norm) 
-
-        gradient_dict = { 'rotation_rate_norm': rotation_norm, 
-                          'pure_shear_norm'   : shear_norm,
-                          'dilatation_norm'   : dilatation_norm,
-                          'shear_rate_norm'   : dilatation_norm + shear_norm, 
-                          'rotation_zy'       : rotation_zy,
-                          'rotation_xz'       : rotation_xz,
-                          'rotation_yx'       : rotation_yx,
-                          'shear_yx'          : strain_yx,
-                          'shear_xz'          : strain_xz,
-                          'shear_zy'          : strain_zy,
-                          'Q'                 : Q, 
-                          'UMAG'              : u_mag,
-                          'DIL'               : dilatation, 
-                          'VORTMAG'           : np.sqrt(rotation_norm) }
+# Block mean of a chunk with the remainder policy of coarser_field
+    def block_reduce(self, chunk, widths, remainder, weights=None):
+        if remainder == 'drop':
+            block_size = [(n // w) * w for n, w in zip(np.shape(chunk), widths)]
+            chunk      = chunk[:block_size[0],:block_size[1],:block_size[2]]
+            if weights is not None:
+                weights = weights[:block_size[0],:block_size[1],:block_size[2]]
+        else:
+            pad_width = [(0, -n % w) for n, w in zip(np.shape(chunk), widths)]
+            if remainder == 'pad':
+                chunk = np.pad(chunk, pad_width, mode='edge')
+                if weights is not None:
+                    weights = np.pad(weights, pad_width, mode='edge')
+            elif weights is None:
+                # Zero padding, block sums over the number of real cells 
+                block_cells = [np.minimum(w, n - np.arange(0, n, w)) for n, w 
+                               in zip(np.shape(chunk), widths)]
+                block_cells = (block_cells[0][:,None,None] * 
+                               block_cells[1][None,:,None] * 
+                               block_cells[2][None,None,:])
+                return (self.block_mean(np.pad(chunk, pad_width), widths) * 
+                        np.prod(widths) / block_cells)
+            else:
+                # Zero weights on the padding, mean of the remaining cells 
+                chunk   = np.pad(chunk, pad_width)
+                weights = np.pad(weights, pad_width)
+        if weights is None:
+            return self.block_mean(chunk, widths)
+        return (self.block_mean(chunk * weights, widths) / 
+                self.block_mean(weights, widths))
+
+# Cell volumes of the grid (dX dY dZ from central differences), weights 
+# for grid weighted block means
+    def cell_volumes(self, grid_3D):
+        dx = np.gradient(grid_3D['X'], axis=0)
+        dy = np.gradient(grid_3D['Y'], axis=1)
+        dz = np.gradient(grid_3D['Z'], axis=2)
+        return np.abs(dx * dy * dz)
+
+# Block mean of a 3D array in blocks of width w (int or [wx, wy, wz], 
+# dims divisible by the widths), accumulated in float64
+    def block_mean(self, array_3D, width):
+        [wx, wy, wz] = [int(w) for w in np.broadcast_to(width, 3)]
+        [nx, ny, nz] = np.shape(array_3D) 
+        array_3D     = np.reshape(array_3D, [nx // wx, wx, ny // wy, wy, 
+                                             nz // wz, wz])
+        return np.mean(array_3D, axis=(1,3,5), dtype=np.float64)
+
+# Multi-resolution pyramid, level n is the 2**n block mean of the field 
+# (trailing planes that do not fill a block are dropped). Level 1 is built 
+# from x chunks of the field (memory maps or compressed fields are not 
+# loaded at once), the next levels from the previous one. Returns a list 
+# with the levels [2x, 4x, 8x, ...], stops early if a dimension is below 2
+    def coarser_pyramid(self, field_3D, n_levels=3, chunk_size=64):
+        chunk_size   = 2 * max(chunk_size // 2, 1)
+        [nx, ny, nz] = [2 * (n // 2) for n in np.shape(field_3D)]
+        pyramid      = [ ]
+        if min(nx, ny, nz) < 2 or n_levels < 1:
+            return pyramid 
+        level_n = np.empty([nx // 2, ny // 2, nz // 2], dtype=np.float64)
+        for i in range(0, nx, chunk_size):
+            i_end = min(i + chunk_size, nx)
+            level_n[i//2:i_end//2] = self.block_mean(
+                                        field_3D[i:i_end,:ny,:nz], 2)
+        pyramid.append(level_n.astype(self.dtype))
+        for _ in range(1, n_levels):
+            [nx, ny, nz] = [2 * (n // 2) for n in np.shape(level_n)]
+            if min(nx, ny, nz) < 2:
+                break
+            level_n = self.block_mean(level_n[:nx,:ny,:nz], 2)
+            pyramid.append(level_n.astype(self.dtype))
+        return pyramid 
+
+# Return a dictionary with gradient fields, only the outputs asked for 
+# (all by default). Computed in x slabs of chunk_size planes, every term 
+# of a slab is computed once in float64 (see Gradient_Chunk) and only the 
+# outputs are full size (Box.dtype) 
+    def gradient_fields(self, array_dict3D, outputs=None, chunk_size=64):  
+        if outputs is None:
+            outputs = gradient_outputs
+        unknown = [k for k in outputs if k not in gradient_terms]
+        if unknown:
+            raise ValueError(f'Unknown gradient outputs {unknown}, use '
+                             f'{gradient_outputs}')
+        nx = np.shape(array_dict3D['GRADV_11'])[0]
+        gradient_dict = { k : np.empty(np.shape(array_dict3D['GRADV_11']), 
+                                       dtype=self.dtype) for k in outputs }
+        for i in range(0, nx, chunk_size):
+            terms = Gradient_Chunk(array_dict3D, slice(i, i + chunk_size))
+            for k in outputs:
+                gradient_dict[k][i:i+chunk_size] = terms[k]
         return gradient_dict 
 
+# Velocity gradient tensor invariants, A_ij = du_i/dx_j = GRADV_ji stacked 
+# as [..., 3, 3]. P = -tr(A), Q = (P^2 - tr(A^2))/2, R = -det(A) (named 
+# P_inv, Q_inv, R_inv, Q in gradient_fields is a different scaling), 
+# lambda2 (middle eigenvalue of S^2 + W^2) and the swirling strength 
+# (imaginary part of the complex eigenvalues of A), see tensor_invariants.
+# Computed in x slabs, max_workers threads work on slabs 
+    def gradient_invariants(self, array_dict3D, outputs=None, chunk_size=4,
+                            max_workers=1, method='closed'):
+        if outputs is None:
+            outputs = invariant_outputs
+        unknown = [k for k in outputs if k not in invariant_outputs]
+        if unknown:
+            raise ValueError(f'Unknown invariant outputs {unknown}, use '
+                             f'{invariant_outputs}')
+        field_size = np.shape(array_dict3D['GRADV_11'])
+        invariant_dict = { k : np.empty(field_size, dtype=self.dtype) 
+                           for k in outputs }
+
+        def invariants_slab(i):
+            x_slice = slice(i, i + chunk_size)
+            tensor  = np.empty(np.shape(array_dict3D['GRADV_11'][x_slice]) + 
+                               (3, 3))
+            for m in range(3):
+                for n in range(3):
+                    tensor[...,m,n] = array_dict3D[f'GRADV_{n+1}{m+1}'][x_slice]
+            slab_dict = self.tensor_invariants(tensor, outputs, method)
+            for k in outputs:
+                invariant_dict[k][x_slice] = slab_dict[k]
+
+        slab_list = range(0, field_size[0], chunk_size)
+        if max_workers > 1:
+            with ThreadPoolExecutor(max_workers=max_workers) as executor:
+                list(executor.map(invariants_slab, slab_list))
+        else:
+            for i in slab_list:
+                invariants_slab(i)
+        return invariant_dict 
+
+# Invariants of a stack of velocity gradient tensors [..., 3, 3], closed 
+# form on the components. lambda2 with method='closed' uses the 
+# trigonometric solution of the symmetric 3x3 eigenproblem, 'eigvalsh' 
+# the batched LAPACK solver 
+    def tensor_invariants(self, tensor, outputs=None, method='closed'):
+        if outputs is None:
+            outputs = invariant_outputs
+        a = [[tensor[...,m,n] for n in range(3)] for m in range(3)]
+        dict_out = { }
+        P = -(a[0][0] + a[1][1] + a[2][2])
+        Q = 0.5 * (P**2 - (a[0][0]**2 + a[1][1]**2 + a[2][2]**2 + 
+                           2 * (a[0][1] * a[1][0] + a[0][2] * a[2][0] + 
+                                a[1][2] * a[2][1])))
+        R = -(a[0][0] * (a[1][1] * a[2][2] - a[1][2] * a[2][1]) - 
+              a[0][1] * (a[1][0] * a[2][2] - a[1][2] * a[2][0]) + 
+              a[0][2] * (a[1][0] * a[2][1] - a[1][1] * a[2][0]))
+        dict_out['P_inv'] = P 
+        dict_out['Q_inv'] = Q 
+        dict_out['R_inv'] = R 
+        # lambda2, S^2 + W^2 = (A^2 + A^T^2) / 2 is symmetric 
+        if 'lambda2' in outputs:
+            if method == 'eigvalsh':
+                tensor_2 = tensor @ tensor 
+                sym_2    = 0.5 * (tensor_2 + np.swapaxes(tensor_2, -1, -2))
+                dict_out['lambda2'] = np.linalg.eigvalsh(sym_2)[...,1]
+            else:
+                a_2 = [[sum([a[m][l] * a[l][n] for l in range(3)]) 
+                        for n in range(3)] for m in range(3)]
+                s_2 = [[0.5 * (a_2[m][n] + a_2[n][m]) for n in range(3)] 
+                       for m in range(3)]
+                dict_out['lambda2'] = self.symmetric_middle_eigenvalue(s_2)
+        # Swirling strength, eigenvalues of A are the roots of 
+        # l^3 + P l^2 + Q l + R = 0, with l = t - P/3: t^3 + p t + q = 0.
+        # Complex pair if (q/2)^2 + (p/3)^3 > 0, its imaginary part is 
+        # sqrt(3)/2 |cbrt(-q/2 + sqrt(D)) - cbrt(-q/2 - sqrt(D))|
+        if 'swirling_strength' in outputs:
+            p  = Q - P**2 / 3
+            q  = 2 * P**3 / 27 - P * Q / 3 + R 
+            D  = (q / 2)**2 + (p / 3)**3
+            sqrt_D = np.sqrt(np.maximum(D, 0))
+            dict_out['swirling_strength'] = np.where(D > 0, 
+                        np.sqrt(3) / 2 * np.abs(np.cbrt(-q / 2 + sqrt_D) - 
+                                                np.cbrt(-q / 2 - sqrt_D)), 0.0)
+        return { k : dict_out[k] for k in outputs }
+
+# Middle eigenvalue of symmetric 3x3 matrices given by components m[i][j],
+# trigonometric solution: M = q I + p B, eigenvalues q + 2 p cos(phi + 
+# 2 pi k / 3) with phi = arccos(det(B) / 2) / 3 
+    def symmetric_middle_eigenvalue(self, m):
+        q  = (m[0][0] + m[1][1] + m[2][2]) / 3 
+        p1 = m[0][1]**2 + m[0][2]**2 + m[1][2]**2 
+        p2 = (m[0][0] - q)**2 + (m[1][1] - q)**2 + (m[2][2] - q)**2 + 2 * p1 
+        p  = np.sqrt(p2 / 6)
+        p_safe = np.where(p > 0, p, 1.0)
+        b  = [[(m[i][j] - (q if i == j else 0)) / p_safe for j in range(3)] 
+              for i in range(3)]
+        det_b = (b[0][0] * (b[1][1] * b[2][2] - b[1][2] * b[2][1]) - 
+                 b[0][1] * (b[1][0] * b[2][2] - b[1][2] * b[2][0]) + 
+                 b[0][2] * (b[1][0] * b[2][1] - b[1][1] * b[2][0]))
+        phi = np.arccos(np.clip(det_b / 2, -1, 1)) / 3 
+        eig_max = q + 2 * p * np.cos(phi)
+        eig_min = q + 2 * p * np.cos(phi + 2 * np.pi / 3)
+        return 3 * q - eig_max - eig_min 
+
 # Return fluctuation fields 
     def mean_positions(self, dict_3D):
-        # Loading data
-        x = dict_3D['X']
-        y = dict_3D['Y']
-        z = dict_3D['Z']
+        # Loading data (whole arrays, stored fields may be compressed)
+        x = np.asarray(dict_3D['X'])
+        y = np.asarray(dict_3D['Y'])
+        z = np.asarray(dict_3D['Z'])
         # Declaring empty arrays 
         x_mean = np.empty(self.nx) 
         y_mean = np.empty(self.ny) 
@@ -166,43 +478,76 @@ class Box():
                      'mean_z' : z_mean }
         return dict_out 
 
-# Edge properties  
-    def edge_properties(self, array_field3D, array_height3D, freestream_value):
-        edge_dict      = { }
-        edge_field     = np.empty([self.nx, self.nz]) 
-        edge_thickness = np.empty([self.nx, self.nz]) 
-        cut_value      = 0.99 * freestream_value 
-        # Find positions at 0.99 freestream 
-        for i in range(self.nx):
-            for k in range(self.nz): 
-                indx                = np.abs(array_field3D[i,:,k] - 
-                                          cut_value).argmin() 
-                edge_field[i,k]     = array_field3D[i,:,k][indx] 
-                edge_thickness[i,k] = array_height3D[i,:,k][indx] 
-        # Calculate the mean (compress on z, assume frozen flow)  
-        mean_edge_thickness = np.empty(self.nx)
-        mean_edge_field     = np.empty(self.nx)
-        for i in range(self.nx):
-            mean_edge_thickness[i] = np.mean(edge_thickness[i,:])
-            mean_edge_field[i]     = np.mean(edge_field[i,:])
+# Edge crossing along the last axis (wall-normal), field and height are
+# broadcastable. Returns the field and the height at the point closest to 
+# cut_value, interpolate=True linearly interpolates between that point and
+# the neighbor on the other side of cut_value (nearest point if none) 
+    def edge_crossing(self, field, height, cut_value, interpolate=False):
+        [field, height] = np.broadcast_arrays(field, height)
+        field_diff     = field - cut_value 
+        indx           = np.argmin(np.abs(field_diff), axis=-1)[...,None]
+        edge_field     = np.take_along_axis(field, indx, axis=-1)[...,0]
+        edge_thickness = np.take_along_axis(height, indx, axis=-1)[...,0]
+        if not interpolate:
+            return [edge_field, edge_thickness]
+        # Neighbor that brackets the crossing, upper one first 
+        n_y     = np.shape(field)[-1]
+        indx_up = np.minimum(indx + 1, n_y - 1)
+        indx_dn = np.maximum(indx - 1, 0)
+        diff_0  = np.take_along_axis(field_diff, indx, axis=-1)
+        diff_up = np.take_along_axis(field_diff, indx_up, axis=-1)
+        diff_dn = np.take_along_axis(field_diff, indx_dn, axis=-1)
+        up_flag = (diff_0 * diff_up <= 0) & (indx_up != indx)
+        dn_flag = ~up_flag & (diff_0 * diff_dn <= 0) & (indx_dn != indx)
+        indx_2  = np.where(up_flag, indx_up, np.where(dn_flag, indx_dn, indx))
+        diff_2  = np.take_along_axis(field_diff, indx_2, axis=-1)
+        # Linear weight between indx and indx_2 (0 if there is no crossing)
+        weight  = np.divide(-diff_0, diff_2 - diff_0, 
+                            out=np.zeros(np.shape(diff_0)), 
+                            where=(diff_2 != diff_0))[...,0]
+        field_2        = np.take_along_axis(field, indx_2, axis=-1)[...,0]
+        height_2       = np.take_along_axis(height, indx_2, axis=-1)[...,0]
+        edge_field     = edge_field + weight * (field_2 - edge_field)
+        edge_thickness = edge_thickness + weight * (height_2 - edge_thickness)
+        return [edge_field, edge_thickness]
+
+# Edge properties, 0.99 freestream on every (x, z) column of a [nx, ny, nz]
+# field, or of a stacked [n_time, nx, ny, nz] field in one call (the 
+# height is the Y grid, [nx, ny, nz]). Computed in x chunks, the means are
+# over z (frozen flow)
+    def edge_properties(self, array_field3D, array_height3D, freestream_value,
+                        interpolate=False, chunk_size=64):
+        edge_dict  = { }
+        cut_value  = 0.99 * freestream_value 
+        field_size = np.shape(array_field3D)
+        edge_field     = np.empty(field_size[:-2] + field_size[-1:]) 
+        edge_thickness = np.empty(field_size[:-2] + field_size[-1:]) 
+        # Find positions at 0.99 freestream (wall-normal axis last) 
+        for i in range(0, field_size[-3], chunk_size):
+            field_chunk  = np.swapaxes(
+                            array_field3D[...,i:i+chunk_size,:,:], -1, -2)
+            height_chunk = np.swapaxes(
+                            array_height3D[...,i:i+chunk_size,:,:], -1, -2)
+            [edge_field[...,i:i+chunk_size,:], 
+             edge_thickness[...,i:i+chunk_size,:]] = self.edge_crossing(
+                                        field_chunk, height_chunk, cut_value, 
+                                        interpolate=interpolate)
         # Dictionary to return 
         edge_dict['edge_field']          = edge_field 
         edge_dict['edge_thickness']      = edge_thickness 
-        edge_dict['mean_edge_thickness'] = mean_edge_thickness
-        edge_dict['mean_edge_field']     = mean_edge_field  
+        edge_dict['mean_edge_thickness'] = np.mean(edge_thickness, axis=-1)
+        edge_dict['mean_edge_field']     = np.mean(edge_field, axis=-1)
         return edge_dict 
 
-# Edge properties  
-    def edge_properties_mean(self, array_field3D, array_height3D, freestream_value):
-        edge_dict      = { }
-        edge_field     = np.empty(self.nx) 
-        edge_thickness = np.empty(self.nx) 
-        cut_value      = 0.99 * freestream_value 
-        # Find positions at 0.99 freestream 
-        for i in range(self.nx):
-            indx                = np.abs(array_field3D[i,:] - cut_value).argmin() 
-            edge_field[i]       = array_field3D[i,indx] 
-            edge_thickness[i]   = array_height3D[indx] 
+# Edge properties of a mean_xy field [nx, ny] (or [n_time, nx, ny] stacked
+# in time) and the mean_y height [ny] 
+    def edge_properties_mean(self, array_field3D, array_height3D, 
+                             freestream_value, interpolate=False):
+        edge_dict = { }
+        cut_value = 0.99 * freestream_value 
+        [edge_field, edge_thickness] = self.edge_crossing(array_field3D, 
+                                                array_height3D, cut_value, 
+                                                interpolate=interpolate)
         edge_dict['mean_edge_thickness'] = edge_thickness
         edge_dict['mean_edge_field']     = edge_field  
         return edge_dict 
@@ -210,34 +555,23 @@ class Box():
 # Calculates fluctuation fields in a given 3D data set, 
 # assume frozen flow hypothesis on z, and returns a 
 # 2D field as a function of x and y.  
-    def mean_fields(self, array_3D):
-        mean_yz = np.empty([self.ny, self.nz]) 
-        mean_xz = np.empty([self.nx, self.nz]) 
-        mean_xy = np.empty([self.nx, self.ny]) 
-        mean_x  = np.empty(self.nx)
-        mean_y  = np.empty(self.ny)
-        mean_z  = np.empty(self.nz)
-        # Array y-z
-        for k in range(self.nz):
-            for j in range(self.ny):
-                mean_yz[j,k] = np.mean(array_3D[:,j,k]) 
-        # Array x-z
-        for k in range(self.nz):
-            for i in range(self.nx):
-                mean_xz[i,k] = np.mean(array_3D[i,:,k]) 
-        # Array x-y
-        for j in range(self.ny):
-            for i in range(self.nx):
-                mean_xy[i,j] = np.mean(array_3D[i,j,:]) 
-        # Mean x 
-        for i in range(self.nx): 
-            mean_x[i] = np.mean(mean_xy[i,:])
-        # Mean y 
-        for j in range(self.ny):
-            mean_y[j] = np.mean(mean_yz[j,:])
-        # Mean z 
-        for k in range(self.nz):
-            mean_z[k] = np.mean(mean_xz[:,k])
+    def mean_fields(self, array_3D, chunk_size=64):
+        # One pass over x chunks (memory maps, stored or lazy fields are 
+        # read chunk by chunk), plane means accumulated in float64 
+        [nx, ny, nz] = np.shape(array_3D)
+        mean_xy = np.empty([nx, ny]) 
+        mean_xz = np.empty([nx, nz]) 
+        sum_yz  = np.zeros([ny, nz]) 
+        for i in range(0, nx, chunk_size):
+            chunk = array_3D[i:i+chunk_size]
+            mean_xy[i:i+chunk_size] = np.mean(chunk, axis=2, dtype=np.float64)
+            mean_xz[i:i+chunk_size] = np.mean(chunk, axis=1, dtype=np.float64)
+            sum_yz += np.sum(chunk, axis=0, dtype=np.float64)
+        mean_yz = sum_yz / nx 
+        # Line means from the plane means 
+        mean_x  = np.mean(mean_xy, axis=1)
+        mean_y  = np.mean(mean_yz, axis=1)
+        mean_z  = np.mean(mean_xz, axis=0)
 
         dict_out = { 'mean_xy' : mean_xy,
                      'mean_yz' : mean_yz,
@@ -247,37 +581,160 @@ class Box():
                      'mean_z'  : mean_z }
         return dict_out 
 
-# Reynolds Decomposition 
-    def reynolds_decomposition(self, array_3D):
-        decomp_3D = np.empty([self.nx, self.ny, self.nz])
-        for i in range(self.nx):
-            for j in range(self.ny):
-                mean_var = np.mean(array_3D[i,j,:])
-                for k in range(self.nz):
-                    decomp_3D[i,j,k] = array_3D[i,j,k] - mean_var 
-        return decomp_3D
+# Fused fluctuation statistics, one pass over x chunks of the field. 
+# Returns mean_xy, var_xy (mean over z of the squared fluctuation) and 
+# rms_xy, the 3D fluctuation is never built (only chunk-size temporaries)
+    def fluctuation_fields(self, array_3D, chunk_size=64):
+        [nx, ny, nz] = np.shape(array_3D)
+        mean_xy = np.empty([nx, ny]) 
+        var_xy  = np.empty([nx, ny]) 
+        for i in range(0, nx, chunk_size):
+            chunk = np.array(array_3D[i:i+chunk_size], dtype=np.float64)
+            chunk_mean = np.mean(chunk, axis=2)
+            chunk     -= chunk_mean[:,:,None]
+            mean_xy[i:i+chunk_size] = chunk_mean
+            var_xy[i:i+chunk_size]  = np.einsum('ijk,ijk->ij', chunk, chunk) / nz
+        dict_out = { 'mean_xy' : mean_xy,
+                     'var_xy'  : var_xy,
+                     'rms_xy'  : np.sqrt(var_xy) }
+        return dict_out 
+
+# Mean and rms planes of all the fields of a step, plus TKE and turbulent 
+# Mach number (Mt) from the velocity fluctuations and the mean speed of 
+# sound (dict_3D needs Ux, Uy, Uz and SoS). Every field is read once 
+    def turbulence_statistics(self, dict_3D, chunk_size=64):
+        mean_2D = { }
+        rms_2D  = { }
+        var_2D  = { }
+        for k in dict_3D.keys():
+            stats_dict = self.fluctuation_fields(dict_3D[k], chunk_size)
+            mean_2D[k] = stats_dict['mean_xy']
+            rms_2D[k]  = stats_dict['rms_xy']
+            var_2D[k]  = stats_dict['var_xy']
+        # Turbulent Kinetic energy and Mt in rms_2D
+        rms_2D['TKE'] = 0.5 * (rms_2D['Ux'] + rms_2D['Uy'] + rms_2D['Uz']) 
+        rms_2D['Mt']  = (np.sqrt(var_2D['Ux'] + var_2D['Uy'] + var_2D['Uz']) / 
+                         mean_2D['SoS'])
+        return [mean_2D, rms_2D]
+
+# Reynolds Decomposition, array_3D - mean over axis (2 is spanwise, 0 is 
+# time for [n_time, ...] arrays, a tuple averages over several axes). The 
+# mean is accumulated in float64, mean_in (broadcastable, e.g. mean_xy with
+# axis=2) skips its calculation. out is the output buffer, out=array_3D 
+# works in place, by default a new array with self.dtype is returned
+    def reynolds_decomposition(self, array_3D, axis=2, out=None, mean_in=None):
+        if mean_in is None:
+            mean_in = np.mean(array_3D, axis=axis, dtype=np.float64, 
+                              keepdims=True)
+        else:
+            mean_in = np.expand_dims(mean_in, axis)
+        if out is None:
+            out = np.empty(np.shape(array_3D), dtype=self.dtype)
+        np.subtract(array_3D, mean_in, out=out, casting='same_kind')
+        return out 
+
+# Compensated (Kahan) accumulation in place, total += value. Keeps float32
+# accumulators (time averages) accurate, plain sum if compensation is None
+    def compensated_add(self, total, compensation, value):
+        if compensation is None:
+            total += value 
+            return total 
+        # Rounds value to the accumulator dtype first, otherwise a float64 
+        # value hides the float32 rounding from the compensation 
+        value             = np.asarray(value, dtype=total.dtype)
+        value_in          = value - compensation 
+        total_out         = total + value_in 
+        compensation[...] = (total_out - total) - value_in 
+        total[...]        = total_out 
+        return total 
+
+# Error check of the float32 path against the float64 path. Storing in 
+# float32 rounds every value to a relative error of 2**-24 (~6E-8), means
+# accumulate in float64 so mean and fluctuation errors stay at that level
+# of the field magnitude. Returns the max errors relative to max|field|,
+# raises ValueError if any of them is above tolerance
+    def precision_check(self, array_3D, tolerance=1E-5):
+        box_64     = replace(self, dtype='float64')
+        box_32     = replace(self, dtype='float32')
+        array_64   = np.asarray(array_3D, dtype=np.float64)
+        array_32   = array_64.astype(np.float32)
+        scale      = np.max(np.abs(array_64))
+        if scale == 0:
+            scale = 1.0
+        mean_64    = box_64.mean_fields(array_64)
+        mean_32    = box_32.mean_fields(array_32)
+        error_dict = { }
+        for k in mean_64.keys():
+            error_dict[k] = np.max(np.abs(mean_32[k] - mean_64[k])) / scale
+        error_dict['fluctuation'] = np.max(np.abs(
+                                    box_32.reynolds_decomposition(array_32) - 
+                                    box_64.reynolds_decomposition(array_64))
+                                    ) / scale 
+        for k in error_dict.keys():
+            if error_dict[k] > tolerance:
+                raise ValueError(f'float32 {k} error {error_dict[k]:.3E} is '
+                                 f'above tolerance {tolerance:.3E}')
+        return error_dict 
 
 # Auto correlation 
-    def correlation_function(self, radius, field_1, field_2, correlation_len=50):
-        field_len          = len(field_1) - 1
-        numerator          = np.zeros(correlation_len) 
-        denominator        = np.zeros(correlation_len) 
-        radius             -= np.min(radius) 
-        correlation_radius = np.linspace(0, np.max(radius), 
-                                             correlation_len)
-        for i in range(field_len):
-            k = i
-            for j in range(correlation_len):
-                numerator[j]   += (field_1[i] * field_2[k])
-                denominator[j] += field_1[i] * field_2[i] 
-                k += 1
-                if (k > field_len):
-                    break 
+    def correlation_function(self, radius, field_1, field_2, correlation_len=50,
+                             axis=-1, average_axes=None, chunk_size=64):
+        # Correlation along axis of every line of field_1 and field_2 (1D 
+        # lines or 3D fluctuation fields), Wiener-Khinchin: the cross 
+        # correlation of the zero padded lines is irfft(conj(F1) F2). 
+        # correlation[..., r] = sum_i f1[i] f2[i+r] and it is normalized by 
+        # sum_i f1[i] f2[i] over the same i. Lines are moved to the last axis
+        # and computed in chunks of the first other axis 
+        field_size = np.shape(field_1)
+        n_dim      = len(field_size)
+        axis       = axis % n_dim 
+        n_len      = field_size[axis]
+        corr_len   = min(correlation_len, n_len)
+        n_fft      = next_fast_len(2 * n_len)
+        lags       = np.arange(corr_len)
+        out_size   = [n for i, n in enumerate(field_size) if i != axis]
+        numerator   = np.empty(out_size + [corr_len])
+        denominator = np.empty(out_size + [corr_len])
+        # Chunks over the batch axis (first axis that is not axis) 
+        if n_dim == 1:
+            chunk_list = [slice(None)]
+        else:
+            batch_axis = 1 if axis == 0 else 0 
+            chunk_list = [slice(i, i + chunk_size) for i in 
+                          range(0, field_size[batch_axis], chunk_size)]
+        for chunk in chunk_list:
+            key = (slice(None),) * (batch_axis if n_dim > 1 else 0) + (chunk,)
+            line_1 = np.moveaxis(np.asarray(field_1[key], dtype=np.float64), 
+                                 axis, -1)
+            if field_2 is field_1:
+                line_2 = line_1 
+                spec_2 = rfft(line_2, n_fft, axis=-1)
+                spec   = np.abs(spec_2)**2
+            else:
+                line_2 = np.moveaxis(np.asarray(field_2[key], 
+                                     dtype=np.float64), axis, -1)
+                spec   = (np.conj(rfft(line_1, n_fft, axis=-1)) * 
+                          rfft(line_2, n_fft, axis=-1))
+            numerator[chunk]   = irfft(spec, n_fft, axis=-1)[...,:corr_len]
+            energy             = np.cumsum(line_1 * line_2, axis=-1)
+            denominator[chunk] = energy[...,n_len - 1 - lags]
         correlation_norm = numerator / denominator 
+        # Radius of every lag 
+        radius = np.asarray(radius, dtype=np.float64)
+        correlation_radius = np.abs(radius[:corr_len] - radius[0])
         # Dictionary to return 
         correlation_dict = { 'radius'          : correlation_radius,
                              'norm_correlation': correlation_norm, 
                              'correlation'     : numerator }
+        # Averages over the homogeneous axes (input axes numbering) 
+        if average_axes is not None:
+            average_axes = tuple([a % n_dim - (a % n_dim > axis) for a in 
+                                  np.atleast_1d(average_axes)])
+            correlation_dict['mean_correlation'] = np.mean(numerator, 
+                                                           axis=average_axes)
+            correlation_dict['mean_norm_correlation'] = (
+                                    np.sum(numerator, axis=average_axes) / 
+                                    np.sum(denominator, axis=average_axes))
         return correlation_dict
 
 # Length scales 
@@ -298,33 +755,32 @@ class Box():
         return microscale_dict 
 
 # Energy Spectrum 
-    def energy_spectrum(self, Ux, Uy, Uz, n_elements, n_bins=2):
-        # Convert inputs to fourrier space 
-        u_hat    = fft(Ux, n_elements)
-        v_hat    = fft(Uy, n_elements)
-        w_hat    = fft(Uz, n_elements)
-        # Power Spectral Density 
-        psd      = ( (u_hat * np.conj(u_hat) / n_elements).real + 
-                     (v_hat * np.conj(v_hat) / n_elements).real + 
-                     (w_hat * np.conj(w_hat) / n_elements).real ) 
+    def energy_spectrum(self, Ux, Uy, Uz, n_elements, n_bins=2, axis=-1):
+        # Convert inputs to fourrier space, every line along axis in one 
+        # batched call (only the first n_elements/2 frequencies are used)
+        u_hat    = rfft(Ux, n_elements, axis=axis)
+        v_hat    = rfft(Uy, n_elements, axis=axis)
+        w_hat    = rfft(Uz, n_elements, axis=axis)
+        # Power Spectral Density (frequencies in the last axis) 
+        psd      = np.moveaxis((np.abs(u_hat)**2 + np.abs(v_hat)**2 + 
+                                np.abs(w_hat)**2) / n_elements, axis, -1)
         num_bins = int(np.floor(n_elements / n_bins) + 1)
-        bin_vec  = range(1, num_bins + 1)
-        pwf      = np.zeros(num_bins)
-        log_freq = np.log10(bin_vec) 
         # Butterworth filter spectrum with 1/10th 
-        for i in range(num_bins - 1):
-            count   = 0 
-            sum_pwd = 0
-            log_freq_0 = log_freq[i] - 0.05 #initial 
-            log_freq_t = log_freq[i] + 0.05 #final 
-            for j in range(num_bins - 1):
-                if (log_freq[j] > log_freq_0 and log_freq[j] < log_freq_t):
-                    count   += 1
-                    sum_pwd += psd[j]
-            if count != 0:
-                pwf[i] = sum_pwd / count 
-        spectrum = np.append(0, pwf[:-1])
-        return spectrum[1:]
+        return spectrum_filter.decade_filter(psd, num_bins, n_elements)
+
+# Spanwise energy spectrum of every (x, y) column, [nx, ny, n_k], one 
+# batched rfft along z per x chunk 
+    def spectrum_map(self, Ux, Uy, Uz, n_bins=2, chunk_size=64):
+        [nx, ny, nz] = np.shape(Ux)
+        num_bins = int(np.floor(nz / n_bins) + 1)
+        map_out  = np.empty([nx, ny, num_bins - 1])
+        for i in range(0, nx, chunk_size):
+            map_out[i:i+chunk_size] = self.energy_spectrum(Ux[i:i+chunk_size],
+                                                           Uy[i:i+chunk_size],
+                                                           Uz[i:i+chunk_size],
+                                                           n_elements=nz, 
+                                                           n_bins=n_bins)
+        return map_out 
 
 # Wall shear-stress 
     def van_driest(self, s12_mean, ux_mean, y_mean, rho_mean, mu_mean, t_mean):
@@ -23,11 +23,12 @@ sys.path.append(fortran_path)
 import helper_class as helper 
 import aerodynamics_class as aero
 import box_class as box  
+import box_reader
+from field_store import Field_Store
+from result_cache import Result_Cache
+from run_manifest import Run_Manifest
 # Fortran subroutines 
 import f_mapping
-import f_gridReader
-import f_scalarReader 
-import f_vectorReader
 
 # User Inputs 
 data_path         = '/p/lustre1/liza1/dns_margot'
@@ -35,53 +36,55 @@ results_path      = '/p/lustre1/liza1/dns_results'
 box_path          = os.path.join(data_path, 'BOX')  
 pickle_path       = os.path.join(results_path, 'box_pickle')
 temp_path         = os.path.join(results_path, 'temp_data')  
-fluct_pickle_path = os.path.join(results_path, 'fluct_pickle')
+store_path        = os.path.join(results_path, 'box_store')
+mean_store_path   = os.path.join(results_path, 'mean_store')
+spectrum_path     = os.path.join(results_path, 'spectrum_store')
 rms_pickle_path   = os.path.join(results_path, 'rms_pickle')
-nx                = 1439
-ny                = 89
-nz                = 638 
+catalog_file      = os.path.join(pickle_path, 'box_catalog.json')
+summary_file      = os.path.join(pickle_path, 'box_summary.csv')
+run_path          = os.path.join(results_path, 'run_manifest')
+cache_path        = os.path.join(results_path, 'cache')
+cache_size        = 50E9        #[bytes] 
+code_version      = '10.18.2026.1' # change to invalidate cached stages 
 mapping_flag      = False  
 grid_flag         = False
-time_flag         = False  
+catalog_flag      = False  
+resume_flag       = True     # skips the steps done in the run manifest 
+n_workers         = 6      # concurrent .q reads per time step 
+precision         = 'float64'   # 'float32' halves memory and disk 
+store_codec       = None        # None (.npy), 'zlib' or 'lzma' chunks 
+keep_bits         = None        # lossy mantissa bits (None is lossless) 
+pyramid_levels    = 3           # 2x, 4x, 8x block means for quick looks 
+spectrum_flag     = True        # accumulates the spanwise spectrum map 
+grad_outputs      = None        # gradient_fields outputs, needs UMAG (None is all) 
+invariant_list    = [ ]         # gradient_invariants outputs, from the GRADV_ij fields ([ ] skips) 
 a                 = int(sys.argv[1])
 b                 = int(sys.argv[2]) 
 
+# Scans BOX headers and writes the catalog (run this once)
+if catalog_flag:
+    catalog = box_reader.build_catalog(box_path, catalog_file)
+else:
+    catalog = box_reader.load_catalog(catalog_file)
+[nx, ny, nz] = catalog['dims']
+time_steps   = box_reader.catalog_steps(catalog)
+
 # Loading my classes 
 helper = helper.Helper()
 aero   = aero.Aero()
-box    = box.Box(nx=nx, ny=ny, nz=nz)
-
-# Using Fortran subroutines 
-# Convert fortran binaries into python readable files and creates the mapping file 
-n_max = nx * ny * nz
+box    = box.Box(nx=nx, ny=ny, nz=nz, dtype=precision)
+box_store   = Field_Store(store_path, codec=store_codec, keep_bits=keep_bits,
+                          summary=True)
+mean_store  = Field_Store(mean_store_path)
+spectrum_store = Field_Store(spectrum_path)
+cache       = Result_Cache(cache_path, max_size=cache_size,
+                           code_version=code_version)
+run         = Run_Manifest(run_path)
 
-# Run the mapping flag (run this once)
+# Run the mapping flag, only needed to validate the analytic mapping 
 if mapping_flag:
     f_mapping.mapping(nx, ny, nz, temp_path)
 
-# Run the grid flag (only once)
-if grid_flag:
-    f_gridReader.grid_reader(n_max, box_path, temp_path, 'U') 
-
-# List all files in box folder 
-files_in = os.listdir(box_path)
-
-# List all time steps and creates a vector (run this once)
-if time_flag:
-    steps_lst = [idx for idx in files_in if idx.startswith('U')]
-    steps_lst.remove('U.xyz')
-    steps_lst.remove('U.README')
-    time_steps = [ ] 
-    for i in steps_lst: time_steps.append(i.split('.')[1])
-    time_steps.sort() 
-    # Saving a time vector  
-    helper.pickle_manager(pickle_name_file='time_steps', 
-                              pickle_path=pickle_path,
-                              data_to_save=time_steps)
-else:
-    time_steps = helper.pickle_manager(pickle_name_file='time_steps', 
-                                       pickle_path=pickle_path)
-
 # For running multiple times 
 if b == -1:
     time_steps = time_steps[a:]
@@ -89,97 +92,167 @@ else:
     time_steps = time_steps[a:b]  # cutting processing time 
 
 
-# List scalar fields and create as a vector  
-scalar_fields = [ ]
-scalar_lst    = [idx for idx in files_in if time_steps[0] in idx]
-for i in scalar_lst: scalar_fields.append(i.split('.')[0])
-scalar_fields.remove('U')
-scalar_fields.append('Ux')
-scalar_fields.append('Uy')
-scalar_fields.append('Uz')
-scalar_fields.sort() 
+# Scalar fields (U split in Ux, Uy, Uz) and files of the first step 
+scalar_fields = catalog['steps'][time_steps[0]]['fields']
+files_fields  = sorted(catalog['steps'][time_steps[0]]['variables'].keys())
 
-# Loading and saving mapping (run this once) 
+# Analytic mapping, validated against the fortran mapping if requested 
 if mapping_flag:
-    print('Loading fortran mapping and saving as a pickle file')
+    print('Validating analytic mapping against the fortran mapping')
     mapping_file_in = os.path.join(temp_path, 'mappingVector.dat') 
-    mapping         = box.mapping_reader(mapping_data_in=mapping_file_in, 
-                                         pickle_path=pickle_path) 
+    mapping         = box.mapping_reader(mapping_data_in=mapping_file_in) 
 else:
-    print('Loading pickle mapping') 
-    mapping = helper.pickle_manager(pickle_name_file='mapping', 
-                                    pickle_path=pickle_path)
+    mapping = box.mapping_reader() 
 
 # Create grid dictionary with the positions (run this once)
 if grid_flag:
-    grid_in   = ['X', 'Y', 'Z']
+    grid_1D   = box_reader.plot3D_fields(box_path, 'U') 
     grid_dict = { }
     print('Processing grid data')
-    for i in grid_in:
+    for i in grid_1D.keys():
         print(f'Processing {i}') 
-        tmp_array1D  = helper.fortran_data_loader(variable_in=f'{i}.dat',  
-                                                  abs_path_in=temp_path) 
-        grid_dict[i] = box.split_plot3D(array_1D=tmp_array1D, mapping=mapping)
-        os.remove(os.path.join(temp_path, f'{i}.dat')) 
-    # Saving grid as a pickle file 
-    helper.pickle_manager(pickle_name_file='grid_3D', 
-                          pickle_path=pickle_path,
-                          data_to_save=grid_dict)
-
-# Iterates throught time steps and variables for pickle, fluctuations and rms 
-for i in time_steps:
-    f_vectorReader.vector_reader(n_max, box_path, temp_path, 'U', i) 
+        grid_dict[i] = box.split_plot3D(array_1D=grid_1D[i], mapping=mapping)
+    # Saving grid and its pyramid levels in the store 
+    box_store.save('grid', grid_dict)
+    box_store.save_pyramid('grid', { k : box.coarser_pyramid(grid_dict[k], 
+                                   pyramid_levels) for k in grid_dict })
+
+# Stage 1, splitting and gradients (skipped if the .q files, the 
+# precision and the code version did not change). Returns the 3D fields 
+# and the stage info saved in the run manifest 
+def fields_stage(i):
+    step_files = [box_reader.plot3D_file(box_path, j, i) for j in files_fields]
+    step_key   = cache.key('box_step', step_files, 
+                           params={ 'precision' : precision, 
+                                     'codec'     : store_codec,
+                                     'keep_bits' : keep_bits,
+                                     'pyramid'   : pyramid_levels,
+                                     'summary'   : box_store.summary,
+                                     'gradients' : grad_outputs,
+                                     'invariants': invariant_list })
+    if step_key in cache and i in box_store:
+        print(f'Cache hit: box_step {i}')
+        return [box_store.load(i), { 'cache' : 'hit' }]
+
+    # Reads all .q files of the step concurrently (U is split in Ux, Uy, Uz) 
+    [dict_1D, io_stats] = box_reader.step_reader(box_path, i, files_fields,
+                                                 max_workers=n_workers,
+                                                 dtype=precision) 
+
+    # Splits 1D arrays in 3D 
     dict_3D = { }
     for j in scalar_fields:
-        # Creates temp files 
-        if j[0] != 'U': 
-            f_scalarReader.scalar_reader(n_max, box_path, 
-                                     temp_path, j, i)
-
-        # Loads 1D array, splits data in 3D and saves it
-        tmp_array1D = helper.fortran_data_loader(variable_in=f'{i}_{j}.dat',  
-                                                 abs_path_in=temp_path) 
         print(f'Splitting raw data: {i}_{j}')
-        dict_3D[j]  = box.split_plot3D(array_1D=tmp_array1D, mapping=mapping)
-        os.remove(os.path.join(temp_path, f'{i}_{j}.dat')) 
+        dict_3D[j] = box.split_plot3D(array_1D=dict_1D[j], mapping=mapping)
+    del dict_1D 
     
     print(f'Processing gradient data: {i}')
-    grad_3D        = box.gradient_fields(dict_3D) 
+    grad_3D        = box.gradient_fields(dict_3D, outputs=grad_outputs) 
     dict_3D['MU']  = aero.sutherland_law(dict_3D['T'])
     grad_3D['SoS'] = aero.speed_of_sound(dict_3D['T'])
-    sos_mean       = box.mean_fields(grad_3D['SoS'])['mean_xy']
     grad_3D['M']   = grad_3D['UMAG'] / grad_3D['SoS']  
+    if invariant_list:
+        grad_3D.update(box.gradient_invariants(dict_3D, outputs=invariant_list,
+                                               max_workers=n_workers))
     dict_3D.update(grad_3D)
 
-    # Save dictionary as a 3D field and add gradient quantities to it 
-    helper.pickle_manager(pickle_name_file=f'{i}_dict3D', 
-                          pickle_path=pickle_path,
-                          data_to_save=dict_3D)
-
-    # Fluctuation data and rms data  
-    var_keys = list(dict_3D.keys())
-    fluct_3D = { } 
-    rms_2D   = { }
-    print(f'Processing fluctuation and rms data: {i}')
-    for k in var_keys:
-        print(f'Fluctuating data: {i}_{k}')
-        fluct_3D[k] = box.reynolds_decomposition(dict_3D[k])
-
-        print(f'RMS data: {i}_{k}')
-        rms_2D[k] = np.sqrt(box.mean_fields(fluct_3D[k]**2)['mean_xy']) 
-
-    # Turbulent Kinetic energy and Mt  in rms_2D
-    rms_2D['TKE'] = 0.5 * (rms_2D['Ux'] + rms_2D['Uy'] + rms_2D['Uz']) 
-    fluctuations  = (box.mean_fields(fluct_3D['Ux']**2)['mean_xy'] +
-                         box.mean_fields(fluct_3D['Uy']**2)['mean_xy'] +
-                          box.mean_fields(fluct_3D['Uz']**2)['mean_xy'] )
-    rms_2D['Mt']  = np.sqrt(fluctuations) / sos_mean  
-
-    # Saving fluctuation dictionaries 
-    helper.pickle_manager(pickle_name_file=f'{i}_fluct3D', 
-                          pickle_path=fluct_pickle_path, 
-                          data_to_save=fluct_3D)
+    # Save dictionary as a 3D field and add gradient quantities to it, the 
+    # manifest has the summary (min, max, mean, var, NaNs) of every field 
+    attrs    = { 'time_step' : i,
+                 'iteration' : catalog['steps'][i]['iteration'] }
+    manifest = box_store.save(i, dict_3D, attrs=attrs)
+
+    # Pyramid levels (2x, 4x, 8x, ... block means) 
+    print(f'Processing pyramid levels: {i}')
+    box_store.save_pyramid(i, { k : box.coarser_pyramid(dict_3D[k], 
+                                pyramid_levels) for k in dict_3D })
+    cache.put(step_key, manifest)
+    return [dict_3D, { 'cache' : 'miss', 'io' : io_stats['total'] }]
+
+# Stage 2, mean and rms data (computing is skipped if the stored step did
+# not change, the outputs are always written so lost files are rebuilt). 
+# Fused kernel, every field is read once and only the mean_xy planes are 
+# saved, fluctuations are rebuilt on request with Fluctuation_Fields 
+def statistics_stage(i, dict_3D):
+    print(f'Processing mean, rms, TKE and Mt data: {i}')
+    [mean_2D, rms_2D] = cache.compute('statistics', [box_store.step_path(i)],
+                                lambda: box.turbulence_statistics(dict_3D))
+
+    # Saving mean planes 
+    mean_store.save(i, mean_2D)
     # Saving RMS dictionaries 
     helper.pickle_manager(pickle_name_file=f'{i}_rms2D', 
                           pickle_path=rms_pickle_path,
                           data_to_save=rms_2D)
+    return rms_2D
+
+# Stage 3, spanwise spectrum map E(kz; x, y) summed over the steps of 
+# this run (a, b). The sum and its steps are saved after every step, 
+# new_main.py adds the maps of all the runs 
+spectrum_name = f'spectrum_{a}_{b}'
+if spectrum_flag and spectrum_name in spectrum_store:
+    spectrum_sum   = np.array(spectrum_store.load(spectrum_name)['E_sum'])
+    spectrum_steps = spectrum_store.manifest(spectrum_name)['attrs']['steps']
+else:
+    spectrum_sum   = 0.0 
+    spectrum_steps = [ ]
+
+def spectrum_stage(i, dict_3D):
+    global spectrum_sum
+    if i in spectrum_steps:
+        return 
+    print(f'Processing spectrum map: {i}')
+    spectrum_sum = spectrum_sum + box.spectrum_map(dict_3D['Ux'], 
+                                                   dict_3D['Uy'],
+                                                   dict_3D['Uz'], n_bins=2)
+    spectrum_steps.append(i)
+    spectrum_store.save(spectrum_name, { 'E_sum' : spectrum_sum }, 
+                        attrs={ 'steps'   : spectrum_steps, 
+                                'n_steps' : len(spectrum_steps) })
+
+# Resume mode, only the steps with unfinished stages are processed 
+run_stages = ['fields', 'statistics']
+if spectrum_flag:
+    run_stages.append('spectrum')
+if resume_flag:
+    pending_steps = run.pending(time_steps, run_stages)
+    print(f'Resuming: {len(time_steps) - len(pending_steps)} of '
+          f'{len(time_steps)} steps already done')
+    time_steps = pending_steps 
+
+# Iterates throught time steps, every stage is marked as running, then 
+# done (or failed) in the run manifest 
+for i in time_steps:
+    try:
+        # Stage 1 
+        stage = 'fields'
+        if resume_flag and run.is_done(i, 'fields') and i in box_store:
+            dict_3D = box_store.load(i)
+        else:
+            run.start(i, stage)
+            [dict_3D, stage_info] = fields_stage(i)
+            run.done(i, stage, stage_info)
+
+        # Stage 2 
+        stage = 'statistics'
+        run.start(i, stage)
+        rms_2D = statistics_stage(i, dict_3D)
+        run.done(i, stage)
+
+        # Stage 3 
+        if spectrum_flag:
+            stage = 'spectrum'
+            run.start(i, stage)
+            spectrum_stage(i, dict_3D)
+            run.done(i, stage)
+    except Exception as error:
+        run.failed(i, stage, error)
+        raise
+
+# Summary table of all the steps in the store (atomic rename of a per 
+# process temporary file, concurrent slices do not collide), 
+# summary_table() gives the same table without the csv file 
+summary_table = box_store.summary_table() 
+summary_temp  = f'{summary_file}.{a}_{b}.{os.getpid()}.tmp'
+summary_table.to_csv(summary_temp, index=False)
+os.replace(summary_temp, summary_file)
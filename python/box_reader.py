@@ -0,0 +1,287 @@
+#!/opt/homebrew/bin/python3
+'''
+    Date:   10/18/2026
+    Author: Martin E. Liza
+    File:   box_reader.py
+    Def:    Reads PLOT3D box files written by margot directly from
+            python. The solution block is returned as a memory-mapped
+            view, no fortran temporary files are needed.
+
+    Author		    Date		Revision
+    ----------------------------------------------------
+    Martin E. Liza	10/18/2026	Initial version.
+    Martin E. Liza	10/18/2026	Added step_reader, concurrent ingest.
+    Martin E. Liza	10/18/2026	Added box catalog from PLOT3D headers.
+    Martin E. Liza	10/18/2026	Added hyperslab reads (plot3D_slab).
+    Martin E. Liza	10/18/2026	Added dtype to plot3D_load and step_reader.
+'''
+import numpy as np
+import json
+import time
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+# PLOT3D stream files (fortran access='stream', no record markers)
+int_type   = np.dtype(np.int32)
+float_type = np.dtype(np.float64)
+
+# Vector and grid components
+vector_components = { 'U'   : ['Ux', 'Uy', 'Uz'],
+                      'xyz' : ['X', 'Y', 'Z'] }
+
+# Returns the absolute path of a box file, grid if time_step is None
+def plot3D_file(box_path, var_in, time_step=None):
+    if time_step is None:
+        return os.path.join(box_path, f'{var_in}.xyz')
+    return os.path.join(box_path, f'{var_in}.{time_step}.q')
+
+# Reads the header of a PLOT3D file (.q solution or .xyz grid)
+def plot3D_header(file_in):
+    grid_flag = file_in.endswith('.xyz')
+    with open(file_in, 'rb') as f_in:
+        n_blocks              = int(np.fromfile(f_in, dtype=int_type, count=1)[0])
+        [i_max, j_max, k_max] = np.fromfile(f_in, dtype=int_type, count=3)
+        # Solution files carry mach, alpha, reynolds and iteration
+        if grid_flag:
+            [mach, alpha, reynolds, iteration] = [None, None, None, None]
+        else:
+            [mach, alpha, reynolds, iteration] = [float(n) for n in
+                                np.fromfile(f_in, dtype=float_type, count=4)]
+        offset = f_in.tell()
+    n_total     = int(i_max) * int(j_max) * int(k_max)
+    file_size   = os.path.getsize(file_in)
+    n_variables = (file_size - offset) // (n_total * float_type.itemsize)
+    header_dict = { 'n_blocks'    : n_blocks,
+                    'i_max'       : int(i_max),
+                    'j_max'       : int(j_max),
+                    'k_max'       : int(k_max),
+                    'mach'        : mach,
+                    'alpha'       : alpha,
+                    'reynolds'    : reynolds,
+                    'iteration'   : iteration,
+                    'n_total'     : n_total,
+                    'n_variables' : int(n_variables),
+                    'offset'      : offset,
+                    'file_size'   : file_size }
+    return header_dict
+
+# Returns the solution block as a [n_variables, n_total] memmap view
+def plot3D_reader(file_in, header=None):
+    if header is None:
+        header = plot3D_header(file_in)
+    if header['n_blocks'] != 1:
+        raise ValueError(f'{file_in} has {header["n_blocks"]} blocks, '
+                          'only single block files are supported')
+    data_out = np.memmap(file_in, dtype=float_type, mode='r',
+                         offset=header['offset'],
+                         shape=(header['n_variables'], header['n_total']))
+    return data_out
+
+# Names of the variables stored in a file (U -> Ux, Uy, Uz, grid -> X, Y, Z)
+def plot3D_names(var_in, n_variables, time_step=None):
+    if time_step is None:
+        return vector_components['xyz']
+    if n_variables == 1:
+        return [var_in]
+    return vector_components.get(var_in, 
+                [f'{var_in}{n}' for n in range(n_variables)])
+
+# Returns a dictionary of 1D memmap views, vectors are split in components
+# (U -> Ux, Uy, Uz and the grid -> X, Y, Z)
+def plot3D_fields(box_path, var_in, time_step=None):
+    file_in   = plot3D_file(box_path, var_in, time_step)
+    data_in   = plot3D_reader(file_in)
+    var_names = plot3D_names(var_in, data_in.shape[0], time_step)
+    dict_out  = { }
+    for n, name in enumerate(var_names):
+        dict_out[name] = data_in[n]
+    return dict_out
+
+# Returns the file variable and component of a field (Ux -> U, 0)
+def plot3D_component(field_in):
+    for var_in, var_names in vector_components.items():
+        if field_in in var_names:
+            return var_in, var_names.index(field_in)
+    return field_in, 0
+
+# Converts an int or slice into the range of indices of an axis 
+def axis_range(index_in, n_max):
+    if isinstance(index_in, slice):
+        return range(*index_in.indices(n_max))
+    index_in = int(index_in)
+    if index_in < 0:
+        index_in += n_max
+    if not 0 <= index_in < n_max:
+        raise IndexError(f'index {index_in} out of range for axis of {n_max}')
+    return range(index_in, index_in + 1)
+
+# Reads only the [x, y, z] sub-range of a variable component, x, y, z are 
+# ints or slices. i runs fastest on disk, every (j, k) pair is one 
+# contiguous read of the x range (one read per k if x covers the full axis)
+def plot3D_slab(file_in, x=slice(None), y=slice(None), z=slice(None),
+                component=0, header=None):
+    if header is None:
+        header = plot3D_header(file_in)
+    [nx, ny, nz] = [header['i_max'], header['j_max'], header['k_max']]
+    x_range  = axis_range(x, nx)
+    y_range  = axis_range(y, ny)
+    z_range  = axis_range(z, nz)
+    slab_out = np.empty([len(x_range), len(y_range), len(z_range)])
+    # Drops the axes indexed with an int 
+    int_axes = tuple([n for n, index_in in enumerate([x, y, z]) 
+                      if not isinstance(index_in, slice)])
+    if slab_out.size == 0:
+        return np.squeeze(slab_out, axis=int_axes)
+    # Contiguous x block that covers the range 
+    x_0      = min(x_range[0], x_range[-1])
+    x_len    = abs(x_range[-1] - x_range[0]) + 1
+    x_index  = np.asarray(x_range) - x_0 
+    n_0      = component * header['n_total'] 
+    with open(file_in, 'rb') as f_in:
+        for kk, k in enumerate(z_range):
+            # Full x rows, the y range of a k plane is one read  
+            if x_len == nx and y_range.step == 1:
+                n_start = n_0 + k * nx * ny + y_range[0] * nx 
+                f_in.seek(header['offset'] + n_start * float_type.itemsize)
+                block = np.fromfile(f_in, dtype=float_type, 
+                                    count=len(y_range) * nx)
+                slab_out[:,:,kk] = block.reshape(len(y_range), nx).T[x_index]
+                continue
+            for jj, j in enumerate(y_range):
+                n_start = n_0 + k * nx * ny + j * nx + x_0
+                f_in.seek(header['offset'] + n_start * float_type.itemsize)
+                block = np.fromfile(f_in, dtype=float_type, count=x_len)
+                slab_out[:,jj,kk] = block[x_index]
+    return np.squeeze(slab_out, axis=int_axes)
+
+# Reads the [x, y, z] sub-range of a field (Ux, T, X, ...) of a time step 
+def box_slab(box_path, field_in, time_step=None, x=slice(None), 
+             y=slice(None), z=slice(None)):
+    [var_in, component] = plot3D_component(field_in)
+    if var_in == 'xyz':
+        file_in = plot3D_file(box_path, 'U')
+    else:
+        file_in = plot3D_file(box_path, var_in, time_step)
+    return plot3D_slab(file_in, x=x, y=y, z=z, component=component)
+
+# Reads the solution block into memory, [n_variables, n_total] array. 
+# Cast to dtype (float32 storage) one variable at a time if given 
+def plot3D_load(file_in, header=None, dtype=None):
+    if header is None:
+        header = plot3D_header(file_in)
+    if dtype is None or np.dtype(dtype) == float_type:
+        n_values = header['n_variables'] * header['n_total']
+        data_out = np.fromfile(file_in, dtype=float_type, count=n_values, 
+                               offset=header['offset'])
+        return data_out.reshape(header['n_variables'], header['n_total'])
+    data_out = np.empty([header['n_variables'], header['n_total']], 
+                        dtype=dtype)
+    with open(file_in, 'rb') as f_in:
+        f_in.seek(header['offset'])
+        for n in range(header['n_variables']):
+            data_out[n] = np.fromfile(f_in, dtype=float_type, 
+                                      count=header['n_total'])
+    return data_out
+
+# Reads all the variables of a time step concurrently. File reads release 
+# the GIL, so a bounded thread pool keeps several requests in flight. 
+# Returns a dictionary of 1D arrays and the throughput of each file 
+def step_reader(box_path, time_step, var_list, max_workers=4, dtype=None,
+                verbose=True):
+    # Loads one file and times it 
+    def file_loader(var_in):
+        file_in = plot3D_file(box_path, var_in, time_step) 
+        t_0     = time.perf_counter() 
+        data_in = plot3D_load(file_in, dtype=dtype)
+        t_f     = time.perf_counter() - t_0 
+        return var_in, data_in, t_f 
+
+    t_0 = time.perf_counter() 
+    with ThreadPoolExecutor(max_workers=max_workers) as pool:
+        results = list(pool.map(file_loader, var_list))
+    t_total = time.perf_counter() - t_0 
+
+    dict_out   = { }
+    throughput = { }
+    for var_in, data_in, t_f in results:
+        var_names = plot3D_names(var_in, data_in.shape[0], time_step)
+        for n, name in enumerate(var_names):
+            dict_out[name] = data_in[n]
+        size_mb            = (data_in.size * float_type.itemsize) / 1024**2
+        throughput[var_in] = { 'size_MB' : size_mb,
+                               'time_s'  : t_f,
+                               'MB/s'    : size_mb / t_f }
+        if verbose:
+            print(f'Loaded {var_in}.{time_step}.q: {size_mb:.1f} MB in '
+                  f'{t_f:.2f} s ({size_mb / t_f:.1f} MB/s)')
+    # Aggregate throughput of the step 
+    size_mb             = sum([throughput[k]['size_MB'] for k in var_list])
+    throughput['total'] = { 'size_MB' : size_mb,
+                            'time_s'  : t_total,
+                            'MB/s'    : size_mb / t_total }
+    if verbose:
+        print(f'Loaded step {time_step}: {size_mb:.1f} MB in {t_total:.2f} s '
+              f'({size_mb / t_total:.1f} MB/s, {max_workers} workers)')
+    return dict_out, throughput
+
+# Scans the headers of BOX/*.q (and the grid) once and writes a json 
+# catalog with dims, iteration, variables, byte offsets and file sizes 
+def build_catalog(box_path, catalog_file=None, verbose=True):
+    catalog = { 'box_path' : box_path,
+                'dims'     : None,
+                'grid'     : None, 
+                'steps'    : { } }
+    with os.scandir(box_path) as files_in:
+        names_in = sorted([f_in.name for f_in in files_in])
+    for name in names_in:
+        # Grid file, var.xyz 
+        if name.endswith('.xyz'):
+            header          = plot3D_header(os.path.join(box_path, name))
+            catalog['grid'] = { 'file'      : name,
+                                'offset'    : header['offset'],
+                                'file_size' : header['file_size'] }
+        # Solution files, var.step.q 
+        elif name.endswith('.q'):
+            [var_in, step] = name.split('.')[:2]
+            header         = plot3D_header(os.path.join(box_path, name))
+            step_dict      = catalog['steps'].setdefault(step,
+                                    { 'iteration' : header['iteration'],
+                                      'variables' : { },
+                                      'fields'    : [ ] })
+            step_dict['variables'][var_in] = {
+                                    'n_variables' : header['n_variables'],
+                                    'offset'      : header['offset'],
+                                    'file_size'   : header['file_size'] }
+            step_dict['fields'] += plot3D_names(var_in, header['n_variables'],
+                                                step)
+            step_dict['fields'].sort() 
+        else:
+            continue
+        # Every file has to share the same dimensions 
+        dims = [header['i_max'], header['j_max'], header['k_max']]
+        if catalog['dims'] is None:
+            catalog['dims'] = dims
+        elif catalog['dims'] != dims:
+            raise ValueError(f'{name} has dims {dims}, expected '
+                             f'{catalog["dims"]}')
+    if verbose:
+        print(f'Catalog: {len(catalog["steps"])} steps, dims {catalog["dims"]}')
+    # Saving the catalog (atomic rename)  
+    if catalog_file is not None:
+        with open(f'{catalog_file}.tmp', 'w') as f_out:
+            json.dump(catalog, f_out, indent=1)
+        os.replace(f'{catalog_file}.tmp', catalog_file)
+    return catalog
+
+# Loads the catalog, checks the dimensions if dims = [nx, ny, nz] given
+def load_catalog(catalog_file, dims=None):
+    with open(catalog_file, 'r') as f_in:
+        catalog = json.load(f_in)
+    if dims is not None and list(dims) != catalog['dims']:
+        raise ValueError(f'{catalog_file} has dims {catalog["dims"]}, '
+                         f'expected {list(dims)}')
+    return catalog
+
+# Sorted time steps in the catalog 
+def catalog_steps(catalog):
+    return sorted(catalog['steps'].keys())
@@ -0,0 +1,84 @@
+#!/opt/homebrew/bin/python3.9
+'''
+    Date:   10/18/2026
+    Author: Martin E. Liza
+    File:   compression_benchmark.py
+    Def:    Compression ratio and write/read throughput of the field store
+            codecs on the 3D fields of a stored time step.
+            Usage: compression_benchmark.py time_step [var_1 var_2 ...]
+            Reads follow the writes, so read MB/s is mostly page cache
+            (decode cost), not disk throughput; drop the cache between
+            write and read for disk numbers.
+
+    Author		    Date		Revision
+    ----------------------------------------------------
+    Martin E. Liza	10/18/2026	Initial version.
+'''
+import sys
+import os
+import time
+import shutil
+import numpy as np
+from field_store import Field_Store
+
+# User Inputs
+data_path         = '/p/lustre1/liza1/dns_results'
+store_path        = os.path.join(data_path, 'box_store')
+bench_path        = os.path.join(data_path, 'temp_data', 'compression_bench')
+time_step         = sys.argv[1]
+var_list          = sys.argv[2:]
+slice_width       = 8        # x planes read by the slice benchmark
+# [name, codec, level, shuffle, keep_bits]
+codec_list = [ ['raw',           None,   None, False, None],
+               ['zlib',          'zlib', 6,    False, None],
+               ['zlib-shuffle',  'zlib', 6,    True,  None],
+               ['lzma-shuffle',  'lzma', 6,    True,  None],
+               ['zlib-shuffle-32', 'zlib', 6,  True,  32],
+               ['zlib-shuffle-20', 'zlib', 6,  True,  20] ]
+
+# Loading the step
+box_store = Field_Store(store_path)
+field_3D  = box_store.load(time_step)
+if not var_list:
+    var_list = list(field_3D.keys())
+
+# Benchmark table
+print(f'{"codec":>16} {"variable":>10} {"ratio":>7} {"write MB/s":>11} '
+      f'{"read MB/s":>10} {"slice ms":>9} {"max error":>10}')
+for [name, codec, level, shuffle, keep_bits] in codec_list:
+    bench_store = Field_Store(os.path.join(bench_path, name), codec=codec,
+                              level=level, shuffle=shuffle,
+                              keep_bits=keep_bits)
+    size_in  = 0
+    size_out = 0
+    for var in var_list:
+        array_in = np.asarray(field_3D[var])
+        size_MB  = array_in.nbytes / 1E6
+        # Write
+        time_0   = time.perf_counter()
+        manifest = bench_store.add_variables(time_step, { var : array_in })
+        time_w   = time.perf_counter() - time_0
+        var_dict = manifest['variables'][var]
+        file_out = os.path.join(bench_store.step_path(time_step),
+                                var_dict['file'])
+        file_MB  = os.path.getsize(file_out) / 1E6
+        # Full read (page cache, see header)
+        time_0   = time.perf_counter()
+        array_out = np.array(bench_store.load(time_step)[var])
+        time_r   = time.perf_counter() - time_0
+        # Slice read, slice_width x planes from the middle (np.array reads 
+        # the memmap view of the raw codec)
+        x_0      = array_in.shape[0] // 2
+        time_0   = time.perf_counter()
+        slice_out = np.array(bench_store.load(time_step)[var]
+                             [x_0:x_0+slice_width])
+        time_s   = time.perf_counter() - time_0
+        max_error = np.max(np.abs(array_out - array_in) /
+                           np.max(np.abs(array_in)))
+        size_in  += size_MB
+        size_out += file_MB
+        print(f'{name:>16} {var:>10} {size_MB/file_MB:7.2f} '
+              f'{size_MB/time_w:11.1f} {size_MB/time_r:10.1f} '
+              f'{1E3*time_s:9.2f} {max_error:10.2E}')
+    print(f'{name:>16} {"total":>10} {size_in/size_out:7.2f}')
+    shutil.rmtree(bench_store.store_path)
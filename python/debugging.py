@@ -21,32 +21,36 @@ sys.path.append(python_scripts)
 # Loading my classes 
 import helper_class as helper 
 import box_class as box  
+import box_reader
+from field_store import Field_Store
 
 # User Inputs 
 data_path         = '/p/lustre1/liza1/dns_results'
 pickle_path       = os.path.join(data_path, 'box_pickle')
 pickle_results    = os.path.join(data_path, 'sub_pickle')  
-nx                = 1439
-ny                = 89
-nz                = 638 
+store_path        = os.path.join(data_path, 'box_store')
+catalog_file      = os.path.join(pickle_path, 'box_catalog.json')
+catalog           = box_reader.load_catalog(catalog_file)
+[nx, ny, nz]      = catalog['dims']
 
 # Loading my classes 
 helper = helper.Helper()
-box    = box.Box(nx=nx, ny=ny, nz=nz)
+precision         = 'float64'   # 'float32' halves the 3D accumulators 
+box    = box.Box(nx=nx, ny=ny, nz=nz, dtype=precision)
+box_store = Field_Store(store_path)
 spatial_avg_flag  = False
 assemble_name_out = 'temporal_average'
 
 # Loading time steps and grid_3D pickle files   
-time_steps = helper.pickle_manager(pickle_name_file='time_steps', 
-                                   pickle_path=pickle_path)
+time_steps = box_reader.catalog_steps(catalog)
 time_len   = len(time_steps) 
 
 ensemble_avg = { }
+ensemble_err = { }
 for count, val in enumerate(time_steps):
     print(count) 
     # Loading dict_3D, fluctuation_3D and rms_2D
-    field_3D = helper.pickle_manager(pickle_name_file=f'{val}_dict3D', 
-                             pickle_path=pickle_path)
+    field_3D = box_store.load(val)
     # Spatial average
     if spatial_avg_flag:
         spatial_field3D  = { }
@@ -63,11 +67,15 @@ for count, val in enumerate(time_steps):
     # Doesn't do a spatial average 
     if not spatial_avg_flag:
         for k in field_3D.keys():
-            # Creates a matrix of zeros  
+            # Creates a matrix of zeros, float32 uses compensated sums  
             if count == 0:
-                ensemble_avg[k] = np.zeros([nx, ny, nz])
+                ensemble_avg[k] = np.zeros([nx, ny, nz], dtype=box.dtype)
+                ensemble_err[k] = None 
+                if box.dtype == np.float32:
+                    ensemble_err[k] = np.zeros([nx, ny, nz], dtype=box.dtype)
             # Calculate time averages  
-            ensemble_avg[k] += field_3D[k] / time_len
+            box.compensated_add(ensemble_avg[k], ensemble_err[k], 
+                                np.asarray(field_3D[k]) / time_len)
         # Cleaning memory 
         del field_3D
         gc.collect()
@@ -0,0 +1,468 @@
+#!/opt/homebrew/bin/python3
+'''
+    Date:   10/18/2026
+    Author: Martin E. Liza
+    File:   field_store.py
+    Def:    Directory-per-step store of 3D fields, one .npy file per
+            variable plus a json manifest. Loading returns a lazy
+            dictionary of memory-mapped arrays, replaces the monolithic
+            {step}_dict3D pickle files.
+
+    Author		    Date		Revision
+    ----------------------------------------------------
+    Martin E. Liza	10/18/2026	Initial version.
+    Martin E. Liza	10/18/2026	Added add_variables.
+    Martin E. Liza	10/18/2026	Added Fluctuation_View and 
+                                Fluctuation_Fields.
+    Martin E. Liza	10/18/2026	Added chunked compression (zlib, lzma),
+                                byte-shuffle and mantissa truncation.
+    Martin E. Liza	10/18/2026	Added pyramid levels (level_store).
+    Martin E. Liza	10/18/2026	Added per-variable summaries and 
+                                summary_table.
+'''
+import numpy as np
+import pandas as pd
+import json
+import lzma
+import zlib
+import os
+from collections.abc import Mapping
+from dataclasses import dataclass, replace
+
+# Codecs from the standard library 
+codecs = { 'zlib' : [zlib.compress, zlib.decompress],
+           'lzma' : [lzma.compress, lzma.decompress] }
+
+# Byte-shuffle, groups the n-th byte of every value together so exponents 
+# and high mantissa bytes compress well 
+def byte_shuffle(array_in):
+    array_in = np.ascontiguousarray(array_in)
+    bytes_in = array_in.view(np.uint8).reshape(-1, array_in.dtype.itemsize)
+    return bytes_in.T.tobytes()
+
+def byte_unshuffle(bytes_in, dtype, shape):
+    dtype    = np.dtype(dtype)
+    array_in = np.frombuffer(bytes_in, dtype=np.uint8)
+    array_in = array_in.reshape(dtype.itemsize, -1).T.copy()
+    return array_in.view(dtype).reshape(shape)
+
+# Rounds the mantissa to keep_bits bits (lossy), the relative error of each
+# value is bounded by 2**-(keep_bits+1). Non-finite values are not changed 
+def truncate_mantissa(array_in, keep_bits):
+    array_in  = np.asarray(array_in)
+    n_bits    = { 4 : 23, 8 : 52 }[array_in.dtype.itemsize]
+    drop_bits = n_bits - keep_bits 
+    if drop_bits <= 0:
+        return array_in
+    uint_type = { 4 : np.uint32, 8 : np.uint64 }[array_in.dtype.itemsize]
+    bits_in   = array_in.view(uint_type)
+    half      = uint_type(1) << uint_type(drop_bits - 1)
+    mask      = ~((uint_type(1) << uint_type(drop_bits)) - uint_type(1))
+    bits_out  = (bits_in + half) & mask
+    array_out = bits_out.view(array_in.dtype)
+    return np.where(np.isfinite(array_in), array_out, array_in)
+
+# Summary of a field: min, max, mean, variance (NaN excluded) and NaN 
+# count. Accumulated in float64 over x chunks, chunk means and variances 
+# are merged with the pairwise (Chan) update
+def field_summary(array_in, chunk_size=64):
+    array_in = np.atleast_1d(array_in)
+    [n_total, mean, m2] = [0, 0.0, 0.0]
+    [min_val, max_val]  = [np.inf, -np.inf]
+    nan_count           = 0
+    for i in range(0, array_in.shape[0], chunk_size):
+        chunk      = np.asarray(array_in[i:i+chunk_size], 
+                                dtype=np.float64).ravel()
+        nan_mask   = np.isnan(chunk)
+        nan_count += int(np.count_nonzero(nan_mask))
+        chunk      = chunk[~nan_mask]
+        if chunk.size == 0:
+            continue
+        n_chunk    = chunk.size
+        mean_chunk = np.mean(chunk)
+        m2_chunk   = np.sum((chunk - mean_chunk)**2)
+        delta      = mean_chunk - mean
+        n_new      = n_total + n_chunk
+        mean      += delta * n_chunk / n_new
+        m2        += m2_chunk + delta**2 * n_total * n_chunk / n_new
+        n_total    = n_new
+        min_val    = min(min_val, float(np.min(chunk)))
+        max_val    = max(max_val, float(np.max(chunk)))
+    if n_total == 0:
+        [min_val, max_val, mean, var] = [np.nan, np.nan, np.nan, np.nan]
+    else:
+        var = m2 / n_total
+    summary_dict = { 'min'       : float(min_val),
+                     'max'       : float(max_val),
+                     'mean'      : float(mean),
+                     'var'       : float(var),
+                     'nan_count' : nan_count }
+    return summary_dict
+
+# Compressed field, chunks of chunk_size planes along x are compressed 
+# separately so indexing x planes only decompresses the chunks it touches.
+# The last decompressed chunk is kept for consecutive reads of the same 
+# planes, keys over all x (y or z planes, Ellipsis) decompress the field 
+# once and keep it 
+class Compressed_Field():
+    def __init__(self, file_in, var_dict):
+        self.file_in    = file_in
+        self.shape      = tuple(var_dict['shape'])
+        self.dtype      = np.dtype(var_dict['dtype'])
+        self.codec      = var_dict['codec']
+        self.shuffle    = var_dict['shuffle']
+        self.chunk_size = var_dict['chunk_size']
+        self.offsets    = var_dict['offsets']
+        self.last_chunk = [None, None]
+        self.full_array = None 
+
+    @property
+    def ndim(self):
+        return len(self.shape)
+
+    @property
+    def nbytes(self):
+        return int(np.prod(self.shape)) * self.dtype.itemsize
+
+    def __len__(self):
+        return self.shape[0]
+
+# Decompress chunk n, last_chunk is read once (thread safe, other threads
+# may replace it) 
+    def chunk(self, n):
+        [n_last, chunk_last] = self.last_chunk 
+        if n_last == n:
+            return chunk_last
+        with open(self.file_in, 'rb') as f_in:
+            f_in.seek(self.offsets[n])
+            bytes_in = f_in.read(self.offsets[n+1] - self.offsets[n])
+        bytes_in    = codecs[self.codec][1](bytes_in)
+        chunk_shape = ((min(self.chunk_size, self.shape[0] - 
+                            n * self.chunk_size),) + self.shape[1:])
+        if self.shuffle:
+            chunk_out = byte_unshuffle(bytes_in, self.dtype, chunk_shape)
+        else:
+            chunk_out = np.frombuffer(bytes_in, 
+                                      dtype=self.dtype).reshape(chunk_shape)
+        self.last_chunk = [n, chunk_out]
+        return chunk_out
+
+# Whole field, decompressed on the first call 
+    def full(self):
+        full_array = self.full_array 
+        if full_array is None:
+            full_array      = self.planes(0, self.shape[0])
+            self.full_array = full_array 
+        return full_array 
+
+# Decompress the planes [x_start, x_end) 
+    def planes(self, x_start, x_end):
+        full_array = self.full_array 
+        if full_array is not None:
+            return full_array[x_start:x_end]
+        chunks = [self.chunk(n) for n in range(x_start // self.chunk_size,
+                                        (x_end - 1) // self.chunk_size + 1)]
+        block  = np.concatenate(chunks) if len(chunks) > 1 else chunks[0]
+        x_0    = (x_start // self.chunk_size) * self.chunk_size
+        return block[x_start - x_0:x_end - x_0]
+
+    def __getitem__(self, key):
+        if not isinstance(key, tuple):
+            key = (key,)
+        if (len(key) == 0 or key[0] is Ellipsis or 
+            (isinstance(key[0], slice) and 
+             key[0].indices(self.shape[0]) == (0, self.shape[0], 1))):
+            return self.full()[key]
+        [key_x, key_rest] = [key[0], key[1:]]
+        x_index = np.arange(self.shape[0])[key_x]
+        if np.size(x_index) == 0:
+            return np.empty(self.shape, dtype=self.dtype)[key]
+        x_0   = int(np.min(x_index))
+        block = self.planes(x_0, int(np.max(x_index)) + 1)
+        # Index relative to the decompressed block 
+        if isinstance(key_x, slice):
+            [start, end, step] = key_x.indices(self.shape[0])
+            end   = end - x_0 if end - x_0 >= 0 else None
+            key_x = slice(start - x_0, end, step)
+        else:
+            key_x = x_index - x_0
+        return block[(key_x,) + key_rest]
+
+    def __array__(self, dtype=None, copy=None):
+        array_out = self.full()
+        if dtype is not None:
+            return array_out.astype(dtype, copy=False)
+        return array_out
+
+# Lazy dictionary, values are np.load(mmap_mode='r') views (or compressed 
+# fields) loaded on access
+class Lazy_Fields(Mapping):
+    def __init__(self, step_path, manifest):
+        self.step_path = step_path
+        self.manifest  = manifest
+        self.loaded    = { }
+
+    def __getitem__(self, key):
+        if key not in self.loaded:
+            var_dict = self.manifest['variables'][key]
+            file_in  = os.path.join(self.step_path, var_dict['file'])
+            if var_dict.get('codec') is None:
+                self.loaded[key] = np.load(file_in, mmap_mode='r')
+            else:
+                self.loaded[key] = Compressed_Field(file_in, var_dict)
+        return self.loaded[key]
+
+    def __iter__(self):
+        return iter(self.manifest['variables'])
+
+    def __len__(self):
+        return len(self.manifest['variables'])
+
+# Fluctuation view, q - mean_xy (mean over z) computed lazily on access.
+# Only the mean_xy plane is stored, indexing returns the fluctuation of the
+# selected region and full arrays are built chunk by chunk along x
+class Fluctuation_View():
+    def __init__(self, field_3D, mean_xy, chunk_size=64):
+        self.field_3D   = field_3D
+        self.mean_xy    = np.asarray(mean_xy)
+        self.chunk_size = chunk_size
+        if np.shape(self.mean_xy) != np.shape(field_3D)[:2]:
+            raise ValueError(f'mean_xy shape {np.shape(self.mean_xy)} does '
+                             f'not match field shape {np.shape(field_3D)}')
+
+    @property
+    def shape(self):
+        return np.shape(self.field_3D)
+
+    @property
+    def ndim(self):
+        return len(self.shape)
+
+    @property
+    def dtype(self):
+        return self.field_3D.dtype
+
+    def __len__(self):
+        return self.shape[0]
+
+    def __getitem__(self, key):
+        mean_3D = np.broadcast_to(self.mean_xy[:,:,None], self.shape)
+        fluct   = np.asarray(self.field_3D[key]) - mean_3D[key]
+        return fluct.astype(self.dtype, copy=False)
+
+# Full fluctuation field, computed in x chunks
+    def to_array(self, out=None):
+        if out is None:
+            out = np.empty(self.shape, dtype=self.dtype)
+        for i in range(0, self.shape[0], self.chunk_size):
+            out[i:i+self.chunk_size] = self[i:i+self.chunk_size]
+        return out
+
+    def __array__(self, dtype=None, copy=None):
+        array_out = self.to_array()
+        if dtype is not None:
+            return array_out.astype(dtype, copy=False)
+        return array_out
+
+    def __pow__(self, power):
+        out = np.empty(self.shape, dtype=self.dtype)
+        for i in range(0, self.shape[0], self.chunk_size):
+            out[i:i+self.chunk_size] = self[i:i+self.chunk_size]**power
+        return out
+
+# Lazy dictionary of fluctuation views, fields_3D and mean_2D ({var: mean_xy})
+# are dictionaries (or Lazy_Fields) with the same keys
+class Fluctuation_Fields(Mapping):
+    def __init__(self, fields_3D, mean_2D, chunk_size=64):
+        self.fields_3D  = fields_3D
+        self.mean_2D    = mean_2D
+        self.chunk_size = chunk_size
+
+    def __getitem__(self, key):
+        return Fluctuation_View(self.fields_3D[key], self.mean_2D[key],
+                                chunk_size=self.chunk_size)
+
+    def __iter__(self):
+        return iter(self.mean_2D)
+
+    def __len__(self):
+        return len(self.mean_2D)
+
+# Field Store Class, codec is None (.npy files), 'zlib' or 'lzma'. 
+# keep_bits (lossy) rounds the mantissa to keep_bits bits before compressing
+# summary=True saves field_summary of every variable in the manifest 
+@dataclass
+class Field_Store():
+    store_path : str
+    codec      : str  = None
+    level      : int  = None
+    chunk_size : int  = 64
+    shuffle    : bool = True
+    keep_bits  : int  = None
+    summary    : bool = False
+
+# Creates the store folder
+    def __post_init__(self):
+        os.makedirs(self.store_path, exist_ok=True)
+
+# Folder and manifest of a step
+    def step_path(self, step):
+        return os.path.join(self.store_path, f'{step}')
+
+    def manifest_file(self, step):
+        return os.path.join(self.step_path(step), 'manifest.json')
+
+# Lists the steps in the store
+    def steps(self):
+        steps_out = [ ]
+        for step in os.listdir(self.store_path):
+            if os.path.isfile(self.manifest_file(step)):
+                steps_out.append(step)
+        return sorted(steps_out)
+
+# Checks if a step is in the store
+    def __contains__(self, step):
+        return os.path.isfile(self.manifest_file(step))
+
+# Loads the manifest of a step
+    def manifest(self, step):
+        with open(self.manifest_file(step), 'r') as f_in:
+            return json.load(f_in)
+
+# Writes the manifest (atomic rename)
+    def write_manifest(self, step, manifest):
+        manifest_file = self.manifest_file(step)
+        with open(f'{manifest_file}.tmp', 'w') as f_out:
+            json.dump(manifest, f_out, indent=1)
+        os.replace(f'{manifest_file}.tmp', manifest_file)
+
+# Writes one variable as a .npy file (atomic rename), returns its 
+# manifest entry
+    def write_variable(self, step, var_name, array_in):
+        array_in = np.asanyarray(array_in)
+        if self.codec is not None and array_in.ndim > 0:
+            return self.write_compressed(step, var_name, array_in)
+        file_out = f'{var_name}.npy'
+        path_out = os.path.join(self.step_path(step), file_out)
+        with open(f'{path_out}.tmp', 'wb') as f_out:
+            np.save(f_out, array_in)
+        os.replace(f'{path_out}.tmp', path_out)
+        var_dict = { 'file'  : file_out,
+                     'shape' : list(np.shape(array_in)),
+                     'dtype' : str(array_in.dtype) }
+        return var_dict
+
+# Writes one variable as compressed chunks along x (atomic rename), 
+# the chunk offsets go in its manifest entry 
+    def write_compressed(self, step, var_name, array_in):
+        if self.codec not in codecs:
+            raise ValueError(f'Unknown codec {self.codec}, '
+                             f'use one of {list(codecs.keys())}')
+        compress  = codecs[self.codec][0]
+        level_in  = { } if self.level is None else { 'zlib' : 
+                        { 'level' : self.level }, 'lzma' : 
+                        { 'preset' : self.level } }[self.codec]
+        file_out  = f'{var_name}.{self.codec}'
+        path_out  = os.path.join(self.step_path(step), file_out)
+        offsets   = [0]
+        max_error = 0.0
+        with open(f'{path_out}.tmp', 'wb') as f_out:
+            for i in range(0, array_in.shape[0], self.chunk_size):
+                chunk_in = np.ascontiguousarray(array_in[i:i+self.chunk_size])
+                if self.keep_bits is not None and chunk_in.dtype.kind == 'f':
+                    chunk_out = truncate_mantissa(chunk_in, self.keep_bits)
+                    max_error = max(max_error, float(np.max(np.abs(
+                                    chunk_out - chunk_in), initial=0.0)))
+                    chunk_in  = chunk_out
+                if self.shuffle:
+                    bytes_out = byte_shuffle(chunk_in)
+                else:
+                    bytes_out = chunk_in.tobytes()
+                bytes_out = compress(bytes_out, **level_in)
+                f_out.write(bytes_out)
+                offsets.append(offsets[-1] + len(bytes_out))
+        os.replace(f'{path_out}.tmp', path_out)
+        var_dict = { 'file'       : file_out,
+                     'shape'      : list(np.shape(array_in)),
+                     'dtype'      : str(array_in.dtype),
+                     'codec'      : self.codec,
+                     'shuffle'    : self.shuffle,
+                     'chunk_size' : self.chunk_size,
+                     'keep_bits'  : self.keep_bits,
+                     'max_error'  : max_error,
+                     'offsets'    : offsets }
+        return var_dict
+
+# Saves a dictionary of arrays as a step (replaces the step manifest), 
+# attrs are saved in the manifest (header iteration, ...)
+    def save(self, step, dict_in, attrs=None):
+        manifest = { 'step'      : f'{step}',
+                     'attrs'     : { },
+                     'variables' : { } }
+        return self.write_variables(step, dict_in, manifest, attrs)
+
+# Adds variables to a step, only the new arrays are written and the
+# manifest is updated with an atomic rename
+    def add_variables(self, step, dict_in, attrs=None):
+        if step in self:
+            manifest = self.manifest(step)
+        else:
+            manifest = { 'step'      : f'{step}',
+                         'attrs'     : { },
+                         'variables' : { } }
+        return self.write_variables(step, dict_in, manifest, attrs)
+
+# Writes the arrays, then the manifest that points to them
+    def write_variables(self, step, dict_in, manifest, attrs=None):
+        os.makedirs(self.step_path(step), exist_ok=True)
+        for var_name, array_in in dict_in.items():
+            var_dict = self.write_variable(step, var_name, array_in)
+            if self.summary:
+                var_dict['summary'] = field_summary(array_in, 
+                                                    self.chunk_size)
+            manifest['variables'][var_name] = var_dict
+        if attrs is not None:
+            manifest.setdefault('attrs', { }).update(attrs)
+        self.write_manifest(step, manifest)
+        return manifest
+
+# Table of the variable summaries of all the steps (one row per step and
+# variable), only the manifests are read 
+    def summary_table(self, steps=None):
+        if steps is None:
+            steps = self.steps()
+        rows = [ ]
+        for step in steps:
+            manifest = self.manifest(step)
+            for var_name, var_dict in manifest['variables'].items():
+                if 'summary' not in var_dict:
+                    continue
+                row = { 'step' : f'{step}', 'variable' : var_name }
+                row.update(manifest.get('attrs', { }))
+                row.update(var_dict['summary'])
+                rows.append(row)
+        return pd.DataFrame(rows)
+
+# Store of the pyramid level n (2**n block means, see 
+# Box.coarser_pyramid), same codec options as the full resolution store
+    def level_store(self, level):
+        return replace(self, store_path=os.path.join(self.store_path, 
+                                                     f'level_{level}'))
+
+# Saves the pyramid levels of a step, pyramid_3D is { var : [2x, 4x, ...] },
+# add=True adds the variables to the levels (see add_variables)
+    def save_pyramid(self, step, pyramid_3D, add=False):
+        n_levels = min([len(levels) for levels in pyramid_3D.values()])
+        for level in range(1, n_levels + 1):
+            level_store = self.level_store(level)
+            save_level  = level_store.add_variables if add else level_store.save
+            save_level(step, { var : levels[level-1] 
+                               for var, levels in pyramid_3D.items() })
+        return n_levels
+
+# Returns a lazy dictionary of the variables of a step, level > 0 loads 
+# the coarse pyramid level instead of the full resolution
+    def load(self, step, level=0):
+        if level > 0:
+            return self.level_store(level).load(step)
+        return Lazy_Fields(self.step_path(step), self.manifest(step))
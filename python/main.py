@@ -62,9 +62,9 @@ if new_data_flag:
         rho          = probe.working_data[i]['RHO'] 
         pressure_dil = pressure * dilatation 
         nu           = mu / rho
-        probe.add_new_variable(i, 'P-DIL', pressure_dil, pickle_path, 'new_probe_data') 
-        probe.add_new_variable(i, 'MU', mu, pickle_path, 'new_probe_data') 
-        probe.add_new_variable(i, 'NU', nu, pickle_path, 'new_probe_data') 
+        probe.add_new_variables(i, { 'P-DIL' : pressure_dil, 
+                                     'MU'    : mu, 
+                                     'NU'    : nu }, pickle_path, 'new_probe_data') 
 # Add new data line 
     for i in line_keys: 
         mu           = line.sutherland_law(line.working_data[i]['T']) 
@@ -73,9 +73,9 @@ if new_data_flag:
         rho          = line.working_data[i]['RHO'] 
         pressure_dil = pressure * dilatation 
         nu           = mu / rho
-        line.add_new_variable(i, 'P-DIL', pressure_dil, pickle_path, 'new_line_data') 
-        line.add_new_variable(i, 'MU', mu, pickle_path, 'new_line_data') 
-        line.add_new_variable(i, 'NU', nu, pickle_path, 'new_line_data') 
+        line.add_new_variables(i, { 'P-DIL' : pressure_dil, 
+                                    'MU'    : mu, 
+                                    'NU'    : nu }, pickle_path, 'new_line_data') 
 
 if probe_flag:
     for i in probe_keys:
@@ -26,24 +26,22 @@ import helper_class as helper
 import aerodynamics_class as aero
 import box_class as box  
 import box_plots 
+import box_reader
+from field_store import Field_Store
 # Fortran subroutines 
 import f_mapping
-import f_gridReader
-import f_scalarReader 
-import f_vectorReader
 
 # User Inputs 
 data_path    = '../../plate_data/data_15'
 papers_path  = '../../plate_data/papers_data'
 pino_path    = os.path.join(papers_path, 'pino_martin') 
 pickle_path  = os.path.join(data_path, 'pickle')
+store_path   = os.path.join(data_path, 'box_store')
 temp_path    = os.path.join(data_path, 'temp_data')  
 box_path     = os.path.join(data_path, 'BOX')  
 saving_path  = '/Users/martin/Desktop/results'
 saving_path  = os.path.join(data_path, 'results') 
-nx           = 1439
-ny           = 89
-nz           = 638 
+catalog_file = os.path.join(pickle_path, 'box_catalog.json')
 time_step    = '0930000'
 U_init       = 3000        #[m/s] 
 T_init       = 216.66      #[K] 
@@ -57,16 +55,23 @@ working_flag = True
 add_dat_flag = False 
 fluct_flag   = False 
 rms_flag     = False 
+pyramid_lvl  = 3        # pyramid levels saved with the step 
+preview_lvl  = 0        # contour plots from level n (2**n coarser) 
 scalar_in    = [ 'T', 'RHO', 'P',
                  'RHOE', 'GRADRHOMAG', 
                  'GRADV_11', 'GRADV_12', 'GRADV_13',
                  'GRADV_21', 'GRADV_22', 'GRADV_23',
                  'GRADV_31', 'GRADV_32', 'GRADV_33' ]
 
+# Loading dims from the box catalog (box_reader.build_catalog) 
+catalog      = box_reader.load_catalog(catalog_file)
+[nx, ny, nz] = catalog['dims']
+
 # Loading my classes 
 helper = helper.Helper()
 aero   = aero.Aero()
 box    = box.Box(nx=nx, ny=ny, nz=nz)
+box_store = Field_Store(store_path)
 
 # Calculate freestream conditions 
 sos_init     = aero.speed_of_sound(T_init) 
@@ -86,21 +91,16 @@ U_2   = oblique_dict['mach_2'] * sos_2        #[m/s]
 Rho_2 = RHO_init * oblique_dict['Rho_ratio']  #[kg/m3] 
 
 
-# Use fortran subroutines 
+# Use fortran subroutines (mapping only, box files are read by box_reader) 
 if fortran_flag:
-    n_max = nx * ny * nz
     f_mapping.mapping(nx, ny, nz, temp_path)
-    f_gridReader.grid_reader(n_max, box_path, temp_path, 'U') 
-    f_vectorReader.vector_reader(n_max, box_path, temp_path, 'U', time_step) 
-    for i in scalar_in:
-        f_scalarReader.scalar_reader(n_max, box_path, 
-                                     temp_path, i, time_step)
 
-# Opens mapping fortran output and saves it as a pickle file
+# Analytic mapping, validated against the fortran mapping if requested 
 if mapping_flag:
     mapping_file_in = os.path.join(temp_path, 'mappingVector.dat') 
-    mapping         = box.mapping_reader(mapping_data_in=mapping_file_in, 
-                                         pickle_path=pickle_path) 
+    mapping         = box.mapping_reader(mapping_data_in=mapping_file_in) 
+else:
+    mapping = box.mapping_reader() 
 
 # Stores data as a 1D and 3D pickle dictionary
 if writing_flag:
@@ -109,26 +109,26 @@ if writing_flag:
     # Dictionaries 
     dict_1D = { } 
     dict_3D = { }
-    mapping = helper.pickle_manager(pickle_name_file='mapping', 
-                                    pickle_path=pickle_path)
+    # Memory maps the grid, U and scalar .q files  
+    data_1D = box_reader.plot3D_fields(box_path, 'U') 
+    data_1D.update(box_reader.plot3D_fields(box_path, 'U', time_step))
+    for i in scalar_in:
+        data_1D.update(box_reader.plot3D_fields(box_path, i, time_step))
     for i in var_in: 
-        dict_1D[i] = helper.fortran_data_loader(variable_in=f'{i}.dat',  
-                                                abs_path_in=temp_path) 
+        dict_1D[i] = np.array(data_1D[i]) 
         # Splits 1D array into a 3D array
         dict_3D[i] = box.split_plot3D(array_1D=dict_1D[i], mapping=mapping)
     # Saving 1D and 3D arrays 
     helper.pickle_manager(pickle_name_file='dict_1D', pickle_path=pickle_path,
                           data_to_save=dict_1D)
-    helper.pickle_manager(pickle_name_file='dict_3D', pickle_path=pickle_path,
-                          data_to_save=dict_3D)
+    box_store.save(time_step, dict_3D)
+    box_store.save_pyramid(time_step, { k : box.coarser_pyramid(dict_3D[k],
+                                        pyramid_lvl) for k in dict_3D })
 
 # Testing and playing around scripts 
 if working_flag:
     # Loading dictionaries 
-    data_in3D = helper.pickle_manager(pickle_name_file='dict_3D', 
-                                      pickle_path=pickle_path)
-    mapping   = helper.pickle_manager(pickle_name_file='mapping', 
-                                      pickle_path=pickle_path)
+    data_in3D = box_store.load(time_step)
 
     # Only loads after data is being proceed 
     if not fluct_flag and not add_dat_flag: 
@@ -138,42 +138,17 @@ if working_flag:
             rms_3D   = helper.pickle_manager(pickle_name_file='rms_dict_3D', 
                                       pickle_path=pickle_path)
 
-    # Adding data to the dictionaries 
+    # Adding data to the store, only the new variables are written 
     if add_dat_flag:
-        grad_1D        = box.gradient_fields(data_in1D) 
-        grad_1D['MU']  = aero.sutherland_law(data_in1D['T'])
-        grad_1D['SoS'] = aero.speed_of_sound(data_in1D['T'])  
-        grad_1D['M']   = grad_1D['UMAG'] / grad_1D['SoS']  
-        dict_temp1D    = { }
-        dict_temp3D    = { }
-        for i in grad_1D.keys():
-            dict_temp1D[i] = grad_1D[i] 
-            dict_temp3D[i] = box.split_plot3D(array_1D=grad_1D[i], 
-                                            mapping=mapping)
-        # Add new data to dictionaries 
-        for i, key in enumerate(dict_temp1D.keys()):
-            if i == 0: 
-                helper.pickle_dict_add(var_in_data=dict_temp1D[key], 
-                                       var_in_str=key,
-                                       pickle_path=pickle_path, 
-                                       pickle_dict_in='dict_1D',
-                                       pickle_dict_out='new_dict_1D')
-                helper.pickle_dict_add(var_in_data=dict_temp3D[key], 
-                                       var_in_str=key,
-                                       pickle_path=pickle_path, 
-                                       pickle_dict_in='dict_3D',
-                                       pickle_dict_out='new_dict_3D')
-            else:
-                helper.pickle_dict_add(var_in_data=dict_temp1D[key], 
-                                       var_in_str=key,
-                                       pickle_path=pickle_path, 
-                                       pickle_dict_in='new_dict_1D',
-                                       pickle_dict_out='new_dict_1D')
-                helper.pickle_dict_add(var_in_data=dict_temp3D[key], 
-                                       var_in_str=key,
-                                       pickle_path=pickle_path, 
-                                       pickle_dict_in='new_dict_3D',
-                                       pickle_dict_out='new_dict_3D')
+        grad_3D        = box.gradient_fields(data_in3D) 
+        grad_3D['MU']  = aero.sutherland_law(data_in3D['T'])
+        grad_3D['SoS'] = aero.speed_of_sound(data_in3D['T'])  
+        grad_3D['M']   = grad_3D['UMAG'] / grad_3D['SoS']  
+        box_store.add_variables(time_step, grad_3D)
+        box_store.save_pyramid(time_step, { k : box.coarser_pyramid(
+                               grad_3D[k], pyramid_lvl) for k in grad_3D },
+                               add=True)
+        data_in3D      = box_store.load(time_step)
 
     # Adding fluctuations dictionary  
     if fluct_flag:
@@ -255,17 +230,19 @@ if working_flag:
     y_str  = box.str_locations(loc_mean, x=None, y=y_, z=None)  
     x_str  = box.str_locations(loc_mean, x=x_, y=None, z=None) 
 
-    # Longitudinal correlation 
+    # Longitudinal correlation, every x line, averaged over z (homogeneous)
+    # for every y station 
     f_correlation = box.correlation_function(data_in3D['X'][:,y_,z_], 
-                                             fluct_3D['Ux'][:,y_,z_],
-                                             fluct_3D['Ux'][:,y_,z_],
-                                             autocorrelation_len=100) 
+                                             fluct_3D['Ux'], fluct_3D['Ux'],
+                                             correlation_len=100, axis=0,
+                                             average_axes=2) 
+    f_correlation['norm_correlation'] = f_correlation['mean_norm_correlation'][y_] 
 
-    # Transversal correlation 
+    # Transversal correlation, every z line (per x and y station) 
     g_correlation = box.correlation_function(data_in3D['Z'][x_,y_,:], 
-                                             fluct_3D['Ux'][x_,y_,:],
-                                             fluct_3D['Ux'][x_,y_,:],
-                                             autocorrelation_len=100) 
+                                             fluct_3D['Ux'], fluct_3D['Ux'],
+                                             correlation_len=100, axis=2) 
+    g_correlation['norm_correlation'] = g_correlation['norm_correlation'][x_,y_] 
 
     # Looping energy cascade  
     energy_cascade = box.energy_spectrum(data_in3D['X'][x_,y_,:],
@@ -516,21 +493,25 @@ if working_flag:
     box.plot_van_driest(van_driest, x_, x_str,  testing_path=pino_path, 
                         saving_path=saving_path)
 
-    box.plot_contour(data_in3D, grid_dict, grid_x='X', grid_y='Z', field='M', 
-                     slice_cut=40, slice_direction='Y', 
+    # Contour plots from the pyramid level preview_lvl (0 is full resolution), 
+    # the step has the grid so the level is its own grid dictionary 
+    preview_3D  = box_store.load(time_step, level=preview_lvl)
+    preview_cut = { 40 : 40 // 2**preview_lvl, 50 : 50 // 2**preview_lvl }
+    box.plot_contour(preview_3D, preview_3D, grid_x='X', grid_y='Z', field='M', 
+                     slice_cut=preview_cut[40], slice_direction='Y', 
                      levels=500, saving_path=saving_path) 
     box.plot_contour(fluct_3D, grid_dict, grid_x='X', grid_y='Z', field='M', 
                      slice_cut=40, slice_direction='Y', 
                      levels=500, saving_path=saving_path) 
-    box.plot_contour(data_in3D, grid_dict, grid_x='X', grid_y='Z', field='RHO', 
-                     slice_cut=40, slice_direction='Y', 
+    box.plot_contour(preview_3D, preview_3D, grid_x='X', grid_y='Z', field='RHO', 
+                     slice_cut=preview_cut[40], slice_direction='Y', 
                      levels=500, saving_path=saving_path) 
-    box.plot_contour(data_in3D, grid_dict, grid_x='X', grid_y='Z', field='VORTMAG', 
-                     slice_cut=40, slice_direction='Y', 
-                     levels=500, saving_path=saving_path) 
-    box.plot_contour(data_in3D, grid_dict, grid_x='X', grid_y='Z', field='T', 
-                     slice_cut=40, slice_direction='Y', 
+    box.plot_contour(preview_3D, preview_3D, grid_x='X', grid_y='Z', 
+                     field='VORTMAG', slice_cut=preview_cut[40], 
+                     slice_direction='Y', levels=500, saving_path=saving_path) 
+    box.plot_contour(preview_3D, preview_3D, grid_x='X', grid_y='Z', field='T', 
+                     slice_cut=preview_cut[40], slice_direction='Y', 
                      levels=500, saving_path=saving_path) 
-    box.plot_contour(data_in3D, grid_dict, grid_x='X', grid_y='Z', field='Ux', 
-                     slice_cut=50, slice_direction='Y', 
+    box.plot_contour(preview_3D, preview_3D, grid_x='X', grid_y='Z', field='Ux', 
+                     slice_cut=preview_cut[50], slice_direction='Y', 
                      levels=700, saving_path=saving_path) 
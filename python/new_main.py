@@ -23,18 +23,27 @@ import helper_class as helper
 import aerodynamics_class as aero
 import box_class as box  
 import box_plots 
+import box_reader
+from field_store import Field_Store, Fluctuation_Fields
+from result_cache import Result_Cache
 
 # User Inputs 
 data_path         = '/p/lustre1/liza1/dns_results'
 pickle_path       = os.path.join(data_path, 'box_pickle')
-fluct_pickle_path = os.path.join(data_path, 'fluct_pickle')
+store_path        = os.path.join(data_path, 'box_store')
+mean_store_path   = os.path.join(data_path, 'mean_store')
+spectrum_path     = os.path.join(data_path, 'spectrum_store')
 rms_pickle_path   = os.path.join(data_path, 'rms_pickle')
 results_path      = os.path.join(data_path, 'results')  
 pickle_results    = os.path.join(data_path, 'sub_pickle')  
 coars_pickle_path = os.path.join(data_path, 'coarser_pickle') 
-nx                = 1439
-ny                = 89
-nz                = 638 
+catalog_file      = os.path.join(pickle_path, 'box_catalog.json')
+cache_path        = os.path.join(data_path, 'cache')
+cache_size        = 50E9        #[bytes] 
+code_version      = '10.18.2026'
+catalog           = box_reader.load_catalog(catalog_file)
+box_path          = catalog['box_path']
+[nx, ny, nz]      = catalog['dims']
 U_init            = 3000        #[m/s] 
 T_init            = 216.66      #[K] 
 RHO_init          = 0.18874     #[kg/m3] 
@@ -56,6 +65,10 @@ time_avg_flag     = True
 new_data_flag     = False
 coarser_flag      = False #NEED TO BE MOVE 
 f_width           = 34   #NEED TO BE MOVE 
+edge_interpolate  = False  # interpolates the 0.99 freestream crossing 
+spectrum_map_flag = True   # spectra from the box_process spectrum map 
+f_remainder       = 'drop' # 'drop', 'pad' or 'partial' trailing blocks 
+f_weighted        = False  # grid weighted (cell volume) coarse means 
 
 # x_ = [0.06, 0.105, 0.140] => [0, nx/2, 1290]
 # y_ = [0.001, 0.00269] => [3, ny/2] 
@@ -64,6 +77,11 @@ f_width           = 34   #NEED TO BE MOVE
 helper = helper.Helper()
 aero   = aero.Aero()
 box    = box.Box(nx=nx, ny=ny, nz=nz)
+box_store   = Field_Store(store_path)
+mean_store  = Field_Store(mean_store_path)
+spectrum_store = Field_Store(spectrum_path)
+cache       = Result_Cache(cache_path, max_size=cache_size,
+                           code_version=code_version)
 
 # Calculate freestream conditions 
 sos_init     = aero.speed_of_sound(T_init) 
@@ -97,11 +115,10 @@ print(f'The post shock density is {Rho_2:.3} [kg/m^3]')
 
 
 # Loading time steps and grid_3D pickle files   
-time_steps = helper.pickle_manager(pickle_name_file='time_steps', 
-                                   pickle_path=pickle_path)
-grid_3D    = helper.pickle_manager(pickle_name_file='grid_3D', 
-                                   pickle_path=pickle_path)
+time_steps = box_reader.catalog_steps(catalog)
+grid_3D    = box_store.load('grid')
 mean_grid  = box.mean_positions(grid_3D) 
+cell_volume = box.cell_volumes(grid_3D) if f_weighted else None 
 time_len   = len(time_steps) 
 
 # String Locations for plotting 
@@ -114,28 +131,35 @@ dict_out = { }
 for count, val in enumerate(time_steps):
     # Loading dict_3D, fluctuation_3D and rms_2D
     if time_avg_flag:
-        field_3D = helper.pickle_manager(pickle_name_file=f'{val}_dict3D', 
-                                     pickle_path=pickle_path)
+        field_3D = box_store.load(val)
         rms_2D   = helper.pickle_manager(pickle_name_file=f'{val}_rms2D', 
                                      pickle_path=rms_pickle_path)
         proc_3D  = helper.pickle_manager(pickle_name_file=f'{val}_processed',
                                      pickle_path=pickle_results)
-        fluct_3D = helper.pickle_manager(pickle_name_file=f'{val}_fluct3D', 
-                                     pickle_path=fluct_pickle_path)
+        mean_2D  = mean_store.load(val)
+        fluct_3D = Fluctuation_Fields(field_3D, mean_2D)
 
-        # Calculate energy cascade and Van Driest 
+        # Energy cascade (every y station, spanwise lines), only the x_ plane
+        # [ny, nz] is read from the .q file (not needed with the spectrum map)
+        if not spectrum_map_flag:
+            station_U = { }
+            for k in ['Ux', 'Uy', 'Uz']:
+                station_U[k] = box_reader.box_slab(box_path, k, val, x=x_)
+            energy_cascade = box.energy_spectrum(station_U['Ux'], 
+                                                 station_U['Uy'],
+                                                 station_U['Uz'],
+                                                 n_elements=nz, 
+                                                 n_bins=2, axis=-1)
+
+        # Van Driest 
         van_driest     = proc_3D['vanDriest'] 
-        energy_cascade = box.energy_spectrum(field_3D['Ux'][x_,y_,:], 
-                                             field_3D['Uy'][x_,y_,:],
-                                             field_3D['Uz'][x_,y_,:],
-                                             n_elements=nz, 
-                                             n_bins=2)
-        # Dilatation, Shear and rotation
-        dilatation = box.mean_fields(field_3D['dilatation_norm'])['mean_xy']
-        rotation   = box.mean_fields(field_3D['rotation_norm'])['mean_xy']
-        shear      = box.mean_fields(field_3D['shear_norm'])['mean_xy']
-        DIL        = box.mean_fields(field_3D['DIL'])['mean_xy']
-        rho        = box.mean_fields(field_3D['RHO'])['mean_xy']
+        # Dilatation, Shear and rotation (mean_xy at x_, only the x_ plane 
+        # is read from the store) 
+        dilatation = np.mean(field_3D['dilatation_norm'][x_], axis=-1)
+        rotation   = np.mean(field_3D['rotation_norm'][x_], axis=-1)
+        shear      = np.mean(field_3D['shear_norm'][x_], axis=-1)
+        DIL        = np.mean(field_3D['DIL'][x_], axis=-1)
+        rho        = np.mean(field_3D['RHO'][x_], axis=-1)
         
 
         # Initialize at the first iteration
@@ -151,13 +175,12 @@ for count, val in enumerate(time_steps):
             rotation_matrix              = np.empty([time_len, ny])
             DIL_matrix                   = np.empty([time_len, ny])
             shear_matrix                 = np.empty([time_len, ny])
-            velocity_matrix              = np.empty([time_len, nx]) 
-            velocity_thickness_matrix    = np.empty([time_len, nx]) 
-            temperature_matrix           = np.empty([time_len, nx]) 
+            Ux_mean_matrix               = np.empty([time_len, nx, ny]) 
+            T_mean_matrix                = np.empty([time_len, nx, ny]) 
             rho_matrix                   = np.empty([time_len, nx]) 
-            temperature_thickness_matrix = np.empty([time_len, nx]) 
-            energy_spectrum_matrix       = np.empty([time_len, 
-                                                    np.shape(energy_cascade)[0]]) 
+            if not spectrum_map_flag:
+                energy_spectrum_matrix   = np.empty([time_len, ny, 
+                                                np.shape(energy_cascade)[-1]]) 
             # Van Driest values 
             for k in van_driest.keys():
                 if k.split('_')[1] == 'w':
@@ -169,21 +192,20 @@ for count, val in enumerate(time_steps):
                                        np.shape(van_driest[k][x_,:])[0]]) 
 
         # Create Matrices 
-        energy_spectrum_matrix[count] = energy_cascade 
-        velocity_matrix[count]        = proc_3D['velocityEdge']['mean_edge_field'] 
-        temperature_matrix[count]     = proc_3D['temperatureEdge']['mean_edge_field'] 
+        if not spectrum_map_flag:
+            energy_spectrum_matrix[count] = energy_cascade 
+        Ux_mean_matrix[count]         = mean_2D['Ux'] 
+        T_mean_matrix[count]          = mean_2D['T'] 
         Mt_matrix[count]              = rms_2D['Mt'][x_]
         M_matrix[count]               = rms_2D['M'][x_]
         Ux_rms_matrix[count]          = rms_2D['Ux'][x_]
         Uy_rms_matrix[count]          = rms_2D['Uy'][x_]
         Uz_rms_matrix[count]          = rms_2D['Uz'][x_]
-        dilatation_matrix[count]      = dilatation[x_]
-        rotation_matrix[count]        = rotation[x_]
-        rho_matrix[count]             = rho[x_,:]
-        DIL_matrix[count]             = DIL[x_,:]
-        shear_matrix[count]           = shear[x_,:]
-        velocity_thickness_matrix[count]    = proc_3D['velocityEdge']['mean_edge_thickness'] 
-        temperature_thickness_matrix[count] = proc_3D['temperatureEdge']['mean_edge_thickness'] 
+        dilatation_matrix[count]      = dilatation
+        rotation_matrix[count]        = rotation
+        rho_matrix[count]             = rho
+        DIL_matrix[count]             = DIL
+        shear_matrix[count]           = shear
 
         # Iterates through Van Driest 
         for k in van_driest.keys():
@@ -195,49 +217,51 @@ for count, val in enumerate(time_steps):
                 van_driest_matrix[k][count] = van_driest[k][x_,:] 
 
     if new_data_flag:
-        field_3D = helper.pickle_manager(pickle_name_file=f'{val}_dict3D', 
-                                         pickle_path=pickle_path)
-        # Empty dictionary 
-        dict_out = { }
-        # Calculate edge values  
-        # TESTING ML #
-        '''
-        temperature_edge = box.edge_properties(field_3D['T'], grid_3D['Y'],
-                                               freestream_value=T_2)
-        velocity_edge    = box.edge_properties(field_3D['Ux'], grid_3D['Y'],
-                                               freestream_value=U_2)
-        '''
-        temperature_edge = box.edge_properties_mean(box.mean_fields(field_3D['T'])['mean_xy'], 
-                                               mean_grid['mean_y'],
-                                               freestream_value=T_2)
-        velocity_edge    = box.edge_properties_mean(box.mean_fields(field_3D['Ux'])['mean_xy'], 
-                                               mean_grid['mean_y'],
-                                               freestream_value=U_2)
-        # Calculate Van Driest transformation 
-        s12_mean   = box.mean_fields(field_3D['GRADV_12'])
-        Ux_mean    = box.mean_fields(field_3D['Ux'])
-        Y_mean     = box.mean_fields(grid_3D['Y'])
-        rho_mean   = box.mean_fields(field_3D['RHO'])
-        mu_mean    = box.mean_fields(field_3D['MU'])
-        T_mean     = box.mean_fields(field_3D['T'])
-        van_driest = box.van_driest(s12_mean, Ux_mean, Y_mean, 
-                                    rho_mean, mu_mean, T_mean)  
-
-        # Add data to the dictionary 
-        dict_out['velocityEdge']    = velocity_edge 
-        dict_out['temperatureEdge'] = temperature_edge 
-        dict_out['vanDriest']       = van_driest
+        # Edge properties and Van Driest, only computed if the step, the 
+        # grid or the inputs changed 
+        def processed_step():
+            field_3D = box_store.load(val)
+            dict_processed = { }
+            # Mean fields 
+            s12_mean   = box.mean_fields(field_3D['GRADV_12'])
+            Ux_mean    = box.mean_fields(field_3D['Ux'])
+            Y_mean     = box.mean_fields(grid_3D['Y'])
+            rho_mean   = box.mean_fields(field_3D['RHO'])
+            mu_mean    = box.mean_fields(field_3D['MU'])
+            T_mean     = box.mean_fields(field_3D['T'])
+            # Calculate edge values  
+            temperature_edge = box.edge_properties_mean(T_mean['mean_xy'], 
+                                    mean_grid['mean_y'], freestream_value=T_2,
+                                    interpolate=edge_interpolate)
+            velocity_edge    = box.edge_properties_mean(Ux_mean['mean_xy'], 
+                                    mean_grid['mean_y'], freestream_value=U_2,
+                                    interpolate=edge_interpolate)
+            # Calculate Van Driest transformation 
+            van_driest = box.van_driest(s12_mean, Ux_mean, Y_mean, 
+                                        rho_mean, mu_mean, T_mean)  
+            # Add data to the dictionary 
+            dict_processed['velocityEdge']    = velocity_edge 
+            dict_processed['temperatureEdge'] = temperature_edge 
+            dict_processed['vanDriest']       = van_driest
+            return dict_processed
 
+        dict_processed = cache.compute('processed', 
+                            [box_store.step_path(val), 
+                             box_store.step_path('grid')],
+                            processed_step, params={ 'T_2'         : T_2, 
+                                                    'U_2'         : U_2,
+                                                    'interpolate' : edge_interpolate })
         helper.pickle_manager(pickle_name_file=f'{val}_processed',
                               pickle_path=pickle_results,
-                              data_to_save=dict_out)
+                              data_to_save=dict_processed)
     # Creating coarser field 
     if coarser_flag:
-        field_3D = helper.pickle_manager(pickle_name_file=f'{val}_dict3D', 
-                                         pickle_path=pickle_path)
+        field_3D = box_store.load(val)
         dict_out = { }
         for key in field_3D:
-            dict_out[key] = box.coarser_field(field_3D[key], f_width=f_width)
+            dict_out[key] = box.coarser_field(field_3D[key], f_width=f_width,
+                                              remainder=f_remainder,
+                                              weights=cell_volume)
 
     # Save in a pickle file 
     helper.pickle_manager(pickle_name_file=f'{val}_coarse_box_{f_width}',
@@ -245,13 +269,49 @@ for count, val in enumerate(time_steps):
                           data_to_save=dict_out)
 
 if time_avg_flag:
+    # Boundary layer edges of all the steps in one batched call 
+    velocity_edge = box.edge_properties_mean(Ux_mean_matrix, 
+                                    mean_grid['mean_y'], freestream_value=U_2,
+                                    interpolate=edge_interpolate)
+    temperature_edge = box.edge_properties_mean(T_mean_matrix, 
+                                    mean_grid['mean_y'], freestream_value=T_2,
+                                    interpolate=edge_interpolate)
+    velocity_matrix              = velocity_edge['mean_edge_field']
+    velocity_thickness_matrix    = velocity_edge['mean_edge_thickness']
+    temperature_matrix           = temperature_edge['mean_edge_field']
+    temperature_thickness_matrix = temperature_edge['mean_edge_thickness']
+
     # Perform time average 
     velocity_mean         = box.time_average(velocity_matrix)
     velocity_thickness    = box.time_average(velocity_thickness_matrix)
     temperature_mean      = box.time_average(temperature_matrix)
     rho_mean              = box.time_average(rho_matrix)
     temperature_thickness = box.time_average(temperature_thickness_matrix)
-    energy_spectrum_mean  = box.time_average(energy_spectrum_matrix)
+    if spectrum_map_flag:
+        # Spectrum map E(kz; x, y) of all the box_process runs, only the x_ 
+        # plane of every partial sum is read 
+        spectrum_names = [k for k in spectrum_store.steps() 
+                          if k.startswith('spectrum_')]
+        if not spectrum_names:
+            raise FileNotFoundError(f'No spectrum map in {spectrum_path}, run '
+                                    'box_process.py with spectrum_flag')
+        # Partial sums must cover disjoint time steps (overlapping run slices
+        # or restarts with other bounds would count a step twice) 
+        spectrum_steps = { }
+        for k in spectrum_names:
+            for step in spectrum_store.manifest(k)['attrs']['steps']:
+                if step in spectrum_steps:
+                    raise ValueError(f'Time step {step} is in {k} and in '
+                                     f'{spectrum_steps[step]}, remove one of '
+                                     'the overlapping spectrum maps')
+                spectrum_steps[step] = k 
+        spectrum_sum   = sum([np.array(spectrum_store.load(k)['E_sum'][x_]) 
+                              for k in spectrum_names])
+        spectrum_len   = sum([spectrum_store.manifest(k)['attrs']['n_steps'] 
+                              for k in spectrum_names])
+        energy_spectrum_mean = spectrum_sum / spectrum_len 
+    else:
+        energy_spectrum_mean = box.time_average(energy_spectrum_matrix)
     Mt_mean               = box.time_average(Mt_matrix)
     M_mean                = box.time_average(M_matrix)
     Ux_rms_mean           = box.time_average(Ux_rms_matrix)
@@ -281,7 +341,8 @@ if time_avg_flag:
                   'temperature_mean'       : temperature_mean,
                   'rho_mean'               : rho_mean, 
                   'temperature_thickness'  : temperature_thickness,
-                  'energy_spectrum'        : energy_spectrum_mean,
+                  'energy_spectrum'        : energy_spectrum_mean[y_],
+                  'energy_spectrum_y'      : energy_spectrum_mean,
                   'van_driest'             : van_driest_mean,
                   'Mt'                     : Mt_mean, 
                   'M_rms'                  : M_mean,
@@ -313,6 +374,6 @@ if time_avg_flag:
                      fig_name=f'rho_plus_{xn}') 
     box_plots.boundary_layers(velocity_thickness, temperature_thickness, 
                              mean_grid['mean_x'], saving_path=results_path) 
-    box_plots.energy_cascade(energy_spectrum_mean[2:], xy_str, y_plus_str, 
+    box_plots.energy_cascade(energy_spectrum_mean[y_,2:], xy_str, y_plus_str, 
                         shifting_factor=2E7,saving_path=results_path, 
                         fig_name=f'energy_spectrum_{xn}{yn}')
@@ -0,0 +1,118 @@
+#!/opt/homebrew/bin/python3
+'''
+    Date:   10/18/2026
+    Author: Martin E. Liza
+    File:   result_cache.py
+    Def:    Content-addressed cache of derived products. Keys are a hash
+            of the input file identities (path, size, mtime and header
+            iteration), the function name, its parameters and a code
+            version tag. Size-bounded LRU eviction on scratch space.
+
+    Author		    Date		Revision
+    ----------------------------------------------------
+    Martin E. Liza	10/18/2026	Initial version.
+'''
+import hashlib
+import pickle
+import json
+import os
+from dataclasses import dataclass
+import box_reader
+
+# Identity of an input file: path, size, mtime (and iteration for .q files).
+# Store steps (folders) are identified by their manifest
+def file_identity(path_in):
+    path_in = os.path.abspath(path_in)
+    if os.path.isdir(path_in):
+        manifest_file = os.path.join(path_in, 'manifest.json')
+        if os.path.isfile(manifest_file):
+            return file_identity(manifest_file)
+        return [path_in] + [file_identity(os.path.join(path_in, name))
+                            for name in sorted(os.listdir(path_in))]
+    file_stat = os.stat(path_in)
+    identity  = [path_in, file_stat.st_size, file_stat.st_mtime_ns]
+    if path_in.endswith('.q'):
+        identity.append(box_reader.plot3D_header(path_in)['iteration'])
+    return identity
+
+# Cache Class, max_size in bytes (None for unbounded)
+@dataclass
+class Result_Cache():
+    cache_path   : str
+    max_size     : int = None
+    code_version : str = '0'
+
+# Creates the cache folder
+    def __post_init__(self):
+        os.makedirs(self.cache_path, exist_ok=True)
+
+# Hash of the inputs, function name, parameters and code version
+    def key(self, func_name, inputs, params=None):
+        key_in = [func_name, self.code_version,
+                  [file_identity(path_in) for path_in in inputs], params]
+        key_str = json.dumps(key_in, sort_keys=True, default=str)
+        return hashlib.sha256(key_str.encode()).hexdigest()
+
+    def cache_file(self, key):
+        return os.path.join(self.cache_path, f'{key}.pickle')
+
+    def __contains__(self, key):
+        return os.path.isfile(self.cache_file(key))
+
+# Returns the cached value (and marks it as recently used)
+    def get(self, key):
+        cache_file = self.cache_file(key)
+        with open(cache_file, 'rb') as f_in:
+            value = pickle.load(f_in)
+        os.utime(cache_file)
+        return value
+
+# Saves a value (atomic rename of a per process temporary file) and 
+# evicts old entries if needed
+    def put(self, key, value):
+        cache_file = self.cache_file(key)
+        cache_temp = f'{cache_file}.{os.getpid()}.tmp'
+        with open(cache_temp, 'wb') as f_out:
+            pickle.dump(value, f_out)
+        os.replace(cache_temp, cache_file)
+        self.evict(keep=key)
+        return value
+
+# Compute if missing, compute_fn() is only called on a cache miss (or if
+# another process evicted the entry in between)
+    def compute(self, func_name, inputs, compute_fn, params=None):
+        key = self.key(func_name, inputs, params)
+        if key in self:
+            try:
+                value = self.get(key)
+                print(f'Cache hit: {func_name}')
+                return value
+            except FileNotFoundError:
+                pass
+        return self.put(key, compute_fn())
+
+# Least recently used eviction until the cache fits in max_size, entries 
+# removed by other processes sharing the cache are skipped 
+    def evict(self, keep=None):
+        if self.max_size is None:
+            return
+        entries = [ ]
+        for name in os.listdir(self.cache_path):
+            if name.endswith('.pickle'):
+                try:
+                    file_stat = os.stat(os.path.join(self.cache_path, name))
+                except FileNotFoundError:
+                    continue
+                entries.append([file_stat.st_mtime, file_stat.st_size, name])
+        entries.sort()
+        cache_size = sum([entry[1] for entry in entries])
+        for [_, size, name] in entries:
+            if cache_size <= self.max_size:
+                break
+            if keep is not None and name == f'{keep}.pickle':
+                continue
+            try:
+                os.remove(os.path.join(self.cache_path, name))
+            except FileNotFoundError:
+                pass
+            cache_size -= size
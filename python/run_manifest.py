@@ -0,0 +1,88 @@
+#!/opt/homebrew/bin/python3
+'''
+    Date:   10/18/2026
+    Author: Martin E. Liza
+    File:   run_manifest.py
+    Def:    Run manifest of box_process.py, status of every stage of
+            every time step ('running', 'done' or 'failed'). One json
+            file per step written with an atomic rename, so concurrent
+            jobs over different slices of time steps do not collide.
+
+    Author		    Date		Revision
+    ----------------------------------------------------
+    Martin E. Liza	10/18/2026	Initial version.
+'''
+import json
+import time
+import socket
+import os
+from dataclasses import dataclass
+
+# Run Manifest Class
+@dataclass
+class Run_Manifest():
+    run_path: str
+
+# Creates the run folder
+    def __post_init__(self):
+        os.makedirs(self.run_path, exist_ok=True)
+
+    def step_file(self, step):
+        return os.path.join(self.run_path, f'{step}.json')
+
+# Status of all the stages of a step ({ } if the step never ran)
+    def status(self, step):
+        step_file = self.step_file(step)
+        if not os.path.isfile(step_file):
+            return { }
+        with open(step_file, 'r') as f_in:
+            return json.load(f_in)
+
+# Writes the status of a step (atomic rename)
+    def write_status(self, step, status):
+        step_file = self.step_file(step)
+        with open(f'{step_file}.tmp', 'w') as f_out:
+            json.dump(status, f_out, indent=1)
+        os.replace(f'{step_file}.tmp', step_file)
+
+# Updates one stage of a step, info is saved with it (timings, sizes)
+    def update(self, step, stage, state, info=None):
+        status        = self.status(step)
+        status[stage] = { 'status' : state,
+                          'time'   : time.strftime('%Y-%m-%d %H:%M:%S'),
+                          'host'   : socket.gethostname(),
+                          'pid'    : os.getpid() }
+        if info is not None:
+            status[stage]['info'] = info
+        self.write_status(step, status)
+
+    def start(self, step, stage):
+        self.update(step, stage, 'running')
+
+    def done(self, step, stage, info=None):
+        self.update(step, stage, 'done', info)
+
+    def failed(self, step, stage, error):
+        self.update(step, stage, 'failed', { 'error' : repr(error) })
+
+# Checks if a stage (or all the given stages) of a step finished
+    def is_done(self, step, stages):
+        if isinstance(stages, str):
+            stages = [stages]
+        status = self.status(step)
+        return all([status.get(stage, { }).get('status') == 'done'
+                    for stage in stages])
+
+# Steps that did not finish all the given stages
+    def pending(self, time_steps, stages):
+        return [step for step in time_steps if not self.is_done(step, stages)]
+
+# Table of { step : { stage : status } } of the steps in the run folder
+    def summary(self):
+        summary_out = { }
+        for name in sorted(os.listdir(self.run_path)):
+            if name.endswith('.json'):
+                step = name[:-len('.json')]
+                summary_out[step] = { stage : val['status'] for stage, val
+                                      in self.status(step).items() }
+        return summary_out
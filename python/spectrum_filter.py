@@ -0,0 +1,50 @@
+#!/opt/homebrew/bin/python3
+'''
+    Date:   10/18/2026
+    Author: Martin E. Liza
+    File:   spectrum_filter.py
+    Def:    1/10th decade filter of power spectral densities used by
+            Box.energy_spectrum and Base_Analysis.filter_decay. The bin
+            membership is built once per length (cached) and applied to
+            every line with a sparse matrix product.
+
+    Author		    Date		Revision
+    ----------------------------------------------------
+    Martin E. Liza	10/18/2026	Initial version.
+'''
+import numpy as np
+from functools import lru_cache
+from scipy import sparse
+
+# Averaging matrix of the 1/10th decade filter, row i averages the bins j
+# with log10(j+1) inside log10(i+1) -+ 0.05 (first n_bins - 1 bins)
+@lru_cache(maxsize=32)
+def decade_filter_matrix(n_bins):
+    log_freq    = np.log10(np.arange(1, n_bins + 1))[:n_bins-1]
+    log_freq_0  = log_freq - 0.05 #initial
+    log_freq_t  = log_freq + 0.05 #final
+    members     = ((log_freq[None,:] > log_freq_0[:,None]) &
+                   (log_freq[None,:] < log_freq_t[:,None]))
+    [rows, cols] = np.nonzero(members)
+    counts      = np.bincount(rows, minlength=n_bins-1)
+    weights     = 1 / counts[rows]
+    return sparse.csr_matrix((weights, (rows, cols)),
+                             shape=(n_bins-1, n_bins-1))
+
+# Two sided spectrum of real signals from the rfft half, the bins above
+# n_elements / 2 mirror the positive frequencies 
+def two_sided(psd, n_elements):
+    psd = np.asarray(psd)
+    return np.concatenate([psd, psd[...,n_elements-n_elements//2-1:0:-1]],
+                          axis=-1)
+
+# Filters the last axis of psd (any number of lines), returns the filtered
+# first n_bins - 1 bins. An rfft psd (n_elements / 2 + 1 bins) shorter 
+# than the filter is extended with two_sided 
+def decade_filter(psd, n_bins, n_elements=None):
+    psd        = np.asarray(psd)
+    if n_elements is not None and np.shape(psd)[-1] < n_bins - 1:
+        psd    = two_sided(psd, n_elements)
+    lines_in   = np.reshape(psd[...,:n_bins-1], [-1, n_bins-1])
+    lines_out  = decade_filter_matrix(n_bins).dot(lines_in.T).T
+    return np.reshape(lines_out, np.shape(psd)[:-1] + (n_bins-1,))